@@ -0,0 +1,135 @@
+"""Vectorized skip-gram training data for word2vec.py."""
+
+import numpy as np
+
+
+# Draws `num_ns` distinct negative candidates per row from the log-uniform
+# (Zipfian) distribution used by `tf.random.log_uniform_candidate_sampler`,
+# P(k) = (log(k + 2) - log(k + 1)) / log(range_max + 1). All rows are drawn
+# at once; only the rows that contain a repeated candidate are redrawn.
+def log_uniform_negatives(n, num_ns, vocab_size, rng):
+  log_range = np.log(vocab_size + 1)
+
+  def draw(rows):
+    ids = np.exp(rng.random((rows, num_ns)) * log_range).astype(np.int64) - 1
+    return np.minimum(ids, vocab_size - 1)
+
+  negatives = draw(n)
+  while num_ns > 1:
+    ordered = np.sort(negatives, axis=1)
+    repeated = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+    if not repeated.any():
+      break
+    negatives[repeated] = draw(int(repeated.sum()))
+  return negatives
+
+
+# Generates every positive (target, context) pair of a block of padded
+# sequences with one array operation per window offset. Like
+# `tf.keras.preprocessing.sequence.skipgrams`, a target word is kept with
+# probability `sampling_table[word]` and padding (0) is never paired.
+def skipgram_pairs(sequences, window_size, sampling_table, rng):
+  sequences = np.asarray(sequences, dtype=np.int64)
+  keep = sequences != 0
+  if sampling_table is not None:
+    keep &= rng.random(sequences.shape) < sampling_table[sequences]
+
+  targets, contexts = [], []
+  for offset in range(-window_size, window_size + 1):
+    if offset == 0:
+      continue
+    if offset > 0:
+      target, context = sequences[:, :-offset], sequences[:, offset:]
+      mask = keep[:, :-offset] & (context != 0)
+    else:
+      target, context = sequences[:, -offset:], sequences[:, :offset]
+      mask = keep[:, -offset:] & (context != 0)
+    targets.append(target[mask])
+    contexts.append(context[mask])
+  return np.concatenate(targets), np.concatenate(contexts)
+
+
+# Batched replacement for `generate_training_data`. Sequences are processed
+# in blocks of `block_size` sentences; each block produces its positive
+# pairs and all of its negatives in a single draw. Negatives come from the
+# log-uniform distribution unless an `AliasSampler` is given. Returns arrays
+# shaped like the original: targets (N,), contexts and labels (N, num_ns + 1).
+def generate_training_data_fast(sequences, window_size, num_ns, vocab_size,
+                                seed, sampling_table=None, block_size=8192,
+                                negative_sampler=None):
+  rng = np.random.default_rng(seed)
+  sequences = np.asarray(sequences)
+  if sampling_table is None:
+    sampling_table = make_sampling_table(vocab_size)
+
+  targets, contexts = [], []
+  for start in range(0, len(sequences), block_size):
+    target, context = skipgram_pairs(
+        sequences[start:start + block_size], window_size, sampling_table, rng)
+    if negative_sampler is None:
+      negatives = log_uniform_negatives(len(target), num_ns, vocab_size, rng)
+    else:
+      negatives = negative_sampler.sample((len(target), num_ns), rng)
+    targets.append(target)
+    contexts.append(np.concatenate([context[:, None], negatives], axis=1))
+
+  targets = np.concatenate(targets)
+  contexts = np.concatenate(contexts)
+  labels = np.zeros_like(contexts)
+  labels[:, 0] = 1
+  return targets, contexts, labels
+
+
+# Same table as `tf.keras.preprocessing.sequence.make_sampling_table`: the
+# keep probability of the word of rank i under a Zipf distribution.
+def make_sampling_table(size, sampling_factor=1e-5):
+  gamma = 0.577
+  rank = np.arange(size)
+  rank[0] = 1
+  inv_fq = rank * (np.log(rank) + gamma) + 0.5 - 1.0 / (12.0 * rank)
+  f = sampling_factor * inv_fq
+  return np.minimum(1.0, f / np.sqrt(f))
+
+
+# Walker's alias method for the word2vec noise distribution, the unigram
+# counts raised to `power`. The tables are built once in O(vocab_size);
+# every draw then costs one uniform integer and one uniform float, so
+# millions of negatives are drawn per call with plain array indexing.
+# Padding (0) and the OOV token (1) are never drawn.
+class AliasSampler:
+
+  def __init__(self, counts, power=0.75, exclude=(0, 1)):
+    weights = np.asarray(counts, dtype=np.float64) ** power
+    weights[list(exclude)] = 0.0
+    n = len(weights)
+    scaled = weights * n / weights.sum()
+
+    self.prob = np.ones(n)
+    self.alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+      s, l = small.pop(), large.pop()
+      self.prob[s] = scaled[s]
+      self.alias[s] = l
+      scaled[l] -= 1.0 - scaled[s]
+      (small if scaled[l] < 1.0 else large).append(l)
+
+  def sample(self, shape, rng):
+    column = rng.integers(len(self.prob), size=shape)
+    keep = rng.random(shape) < self.prob[column]
+    return np.where(keep, column, self.alias[column])
+
+  # Graph version for tf.data pipelines: returns a function mapping a pair
+  # count n to an int64 tensor of shape (n, num_ns).
+  def tf_sampler(self, num_ns):
+    import tensorflow as tf
+    prob = tf.constant(self.prob, dtype=tf.float64)
+    alias = tf.constant(self.alias, dtype=tf.int64)
+    size = len(self.prob)
+
+    def sample(n):
+      column = tf.random.uniform((n, num_ns), maxval=size, dtype=tf.int64)
+      keep = tf.random.uniform((n, num_ns), dtype=tf.float64) < tf.gather(prob, column)
+      return tf.where(keep, column, tf.gather(alias, column))
+    return sample
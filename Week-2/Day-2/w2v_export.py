@@ -0,0 +1,60 @@
+"""Binary, memory-mappable embedding exports for word2vec.py."""
+
+import numpy as np
+
+
+# Writes the embedding matrix as `<prefix>.npy` in `dtype` (float32 or
+# float16) together with the vocabulary: `<prefix>.vocab.npy` holds the
+# UTF-8 tokens in id order, `<prefix>.sorted.npy` and `<prefix>.order.npy`
+# the tokens in sorted order and their ids, for lookups by binary search.
+# Every file is a plain .npy array, so `load_embeddings` can memory-map all
+# of them and a large table opens in milliseconds.
+def export_embeddings(weights, vocab, prefix, dtype=np.float32):
+  np.save(prefix + '.npy', np.ascontiguousarray(weights, dtype=dtype))
+  tokens = np.array([word.encode('utf-8') for word in vocab])
+  order = np.argsort(tokens, kind='stable')
+  np.save(prefix + '.vocab.npy', tokens)
+  np.save(prefix + '.sorted.npy', tokens[order])
+  np.save(prefix + '.order.npy', order.astype(np.int64))
+
+
+class Embeddings:
+
+  def __init__(self, prefix, mmap_mode='r'):
+    self.vectors = np.load(prefix + '.npy', mmap_mode=mmap_mode)
+    self.vocab = np.load(prefix + '.vocab.npy', mmap_mode=mmap_mode)
+    self._sorted = np.load(prefix + '.sorted.npy', mmap_mode=mmap_mode)
+    self._order = np.load(prefix + '.order.npy', mmap_mode=mmap_mode)
+
+  def index(self, word):
+    key = word.encode('utf-8')
+    if len(key) > self._sorted.dtype.itemsize:
+      raise KeyError(word)
+    pos = np.searchsorted(self._sorted, key)
+    if pos == len(self._sorted) or self._sorted[pos] != key:
+      raise KeyError(word)
+    return int(self._order[pos])
+
+  def word(self, index):
+    return self.vocab[index].decode('utf-8')
+
+  def __getitem__(self, word):
+    return self.vectors[self.index(word)]
+
+
+def load_embeddings(prefix):
+  return Embeddings(prefix)
+
+
+# Writes the binary format of the original word2vec tool, readable by
+# gensim's `KeyedVectors.load_word2vec_format(path, binary=True)`: a
+# "count dim" header line, then per word its UTF-8 bytes, a space and the
+# raw little-endian float32 vector. Rows are serialized with `tobytes`
+# instead of formatting every float as text. Padding (index 0) is skipped.
+def export_word2vec_binary(weights, vocab, path):
+  weights = np.ascontiguousarray(weights, dtype='<f4')
+  rows = [i for i, word in enumerate(vocab) if i != 0 and word]
+  with open(path, 'wb') as f:
+    f.write('{} {}\n'.format(len(rows), weights.shape[1]).encode('utf-8'))
+    f.writelines(vocab[i].encode('utf-8') + b' ' + weights[i].tobytes() + b'\n'
+                 for i in rows)
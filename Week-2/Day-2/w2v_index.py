@@ -0,0 +1,107 @@
+"""Approximate nearest-neighbour index over word2vec embeddings."""
+
+import time
+
+import numpy as np
+
+
+def _normalize(x):
+  x = np.asarray(x, dtype=np.float32)
+  norms = np.linalg.norm(x, axis=-1, keepdims=True)
+  return x / np.maximum(norms, 1e-12)
+
+
+# Indices and scores of the k largest entries of every row, best first.
+def _topk(scores, k):
+  k = min(k, scores.shape[1])
+  part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+  part_scores = np.take_along_axis(scores, part, axis=1)
+  order = np.argsort(-part_scores, axis=1)
+  return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+# Exact top-k cosine neighbours with one matrix multiplication per block
+# of queries; the reference the index is measured against.
+def brute_force_topk(vectors, queries, k, block_size=1024):
+  vectors = _normalize(vectors)
+  queries = _normalize(queries)
+  ids, scores = [], []
+  for start in range(0, len(queries), block_size):
+    block_ids, block_scores = _topk(queries[start:start + block_size] @ vectors.T, k)
+    ids.append(block_ids)
+    scores.append(block_scores)
+  return np.concatenate(ids), np.concatenate(scores)
+
+
+# Inverted-file (IVF) index for cosine similarity. The unit-normalized
+# vectors are clustered with k-means into `n_lists` cells and stored sorted
+# by cell, with `offsets` marking where each cell starts (a CSR layout). A
+# query is compared with the centroids first and then only with the
+# vectors of its `n_probe` closest cells.
+class IVFIndex:
+
+  def __init__(self, vectors, n_lists=None, iterations=10, seed=42):
+    vectors = _normalize(vectors)
+    n = len(vectors)
+    n_lists = n_lists or max(1, int(np.sqrt(n)))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(n, size=n_lists, replace=False)]
+    for _ in range(iterations):
+      assign = np.argmax(vectors @ centroids.T, axis=1)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assign, vectors)
+      empty = np.bincount(assign, minlength=n_lists) == 0
+      sums[empty] = centroids[empty]
+      centroids = _normalize(sums)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+
+    order = np.argsort(assign, kind='stable')
+    self.centroids = centroids
+    self.ids = order
+    self.vectors = vectors[order]
+    self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+
+  # Queries are grouped by probed cell, so every cell is scored against all
+  # of its queries with one matrix multiplication. Each (query, probe) pair
+  # keeps its top k in its own slot of a padded candidate matrix, and the
+  # final top k is taken over those n_probe * k candidates per query.
+  def search(self, queries, k=10, n_probe=8):
+    queries = _normalize(np.atleast_2d(queries))
+    n_probe = min(n_probe, len(self.centroids))
+    probes, _ = _topk(queries @ self.centroids.T, n_probe)
+
+    cand_ids = np.full((len(queries), n_probe * k), -1, dtype=np.int64)
+    cand_scores = np.full((len(queries), n_probe * k), -np.inf, dtype=np.float32)
+    cells = probes.ravel()
+    order = np.argsort(cells, kind='stable')
+    bounds = np.searchsorted(cells[order], np.arange(len(self.centroids) + 1))
+    for c in np.flatnonzero(np.diff(bounds)):
+      lo, hi = self.offsets[c], self.offsets[c + 1]
+      if lo == hi:
+        continue
+      pairs = order[bounds[c]:bounds[c + 1]]
+      qs, ranks = pairs // n_probe, pairs % n_probe
+      top, top_scores = _topk(queries[qs] @ self.vectors[lo:hi].T, k)
+      slots = ranks[:, None] * k + np.arange(top.shape[1])
+      cand_ids[qs[:, None], slots] = self.ids[lo + top]
+      cand_scores[qs[:, None], slots] = top_scores
+
+    best, scores = _topk(cand_scores, k)
+    return np.take_along_axis(cand_ids, best, axis=1), scores
+
+
+# Recall@k of the index against brute force and the queries per second of
+# both, on the same batch of queries.
+def benchmark(index, vectors, queries, k=10, n_probe=8):
+  start = time.perf_counter()
+  exact, _ = brute_force_topk(vectors, queries, k)
+  brute_seconds = time.perf_counter() - start
+
+  start = time.perf_counter()
+  approx, _ = index.search(queries, k, n_probe)
+  index_seconds = time.perf_counter() - start
+
+  hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx, exact))
+  return {'recall': hits / exact.size,
+          'index_qps': len(queries) / index_seconds,
+          'brute_force_qps': len(queries) / brute_seconds}
@@ -0,0 +1,201 @@
+"""Parallel, sharded preprocessing of a word2vec corpus into TFRecord files."""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import string
+import subprocess
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+from w2v_data import AliasSampler, generate_training_data_fast
+
+SHARD_PATTERN = 'shard-{:05d}.tfrecord.gz'
+RECORD_SIZE = 4096
+
+
+# Standardization shared by word2vec.py and the workers; it has to live in
+# an importable module so the worker processes can rebuild the layer.
+def custom_standardization(input_data):
+  lowercase = tf.strings.lower(input_data)
+  return tf.strings.regex_replace(lowercase,
+                                  '[%s]' % re.escape(string.punctuation), '')
+
+
+# Splits the corpus into `num_shards` byte ranges of about equal size, each
+# starting at the beginning of a line, so every worker reads only its part.
+def _byte_ranges(path_to_file, num_shards):
+  size = os.path.getsize(path_to_file)
+  bounds = [0]
+  with open(path_to_file, 'rb') as f:
+    for i in range(1, num_shards):
+      # Step back one byte so a range that already starts on a line start
+      # does not skip that line
+      f.seek(max(size * i // num_shards - 1, bounds[-1]))
+      f.readline()
+      bounds.append(max(f.tell(), bounds[-1]))
+  bounds.append(size)
+  return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _read_lines(path_to_file, start, end):
+  with open(path_to_file, 'rb') as f:
+    f.seek(start)
+    while f.tell() < end:
+      line = f.readline()
+      if not line:
+        return
+      yield line.rstrip(b'\r\n')
+
+
+# Worker: vectorizes the lines in byte range [start, end) of the corpus,
+# generates their skip-gram examples batch by batch and writes them to one
+# GZIP-compressed TFRecord file. Each record holds up to RECORD_SIZE
+# examples as a serialized int64 matrix of rows [target, context, negatives...].
+def _write_shard(index, path_to_file, out_dir, start, end, vocab,
+                 sequence_length, window_size, num_ns, seed, negative_sampler=None,
+                 sampling_table=None):
+  vectorize_layer = tf.keras.layers.experimental.preprocessing.TextVectorization(
+      standardize=custom_standardization,
+      vocabulary=vocab[2:],  # '' and '[UNK]' are added back by the layer
+      output_mode='int',
+      output_sequence_length=sequence_length)
+  text_ds = (tf.data.Dataset.from_generator(
+                 lambda: _read_lines(path_to_file, start, end),
+                 output_signature=tf.TensorSpec(shape=(), dtype=tf.string))
+             .filter(lambda x: tf.cast(tf.strings.length(x), bool))
+             .batch(1024)
+             .map(vectorize_layer))
+
+  path = os.path.join(out_dir, SHARD_PATTERN.format(index))
+  options = tf.io.TFRecordOptions(compression_type='GZIP')
+  with tf.io.TFRecordWriter(path, options) as writer:
+    for batch, sequences in enumerate(text_ds.as_numpy_iterator()):
+      targets, contexts, _ = generate_training_data_fast(
+          sequences, window_size, num_ns, len(vocab), seed=[seed, index, batch],
+          sampling_table=sampling_table, negative_sampler=negative_sampler)
+      rows = np.concatenate([targets[:, None], contexts], axis=1)
+      for first in range(0, len(rows), RECORD_SIZE):
+        writer.write(tf.io.serialize_tensor(rows[first:first + RECORD_SIZE]).numpy())
+
+
+def _fingerprint(path_to_file, vocab, **params):
+  stat = os.stat(path_to_file)
+  h = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+  h.update('{}:{}:{}'.format(os.path.abspath(path_to_file), stat.st_size, stat.st_mtime).encode())
+  h.update('\n'.join(vocab).encode())
+  return h.hexdigest()
+
+
+# Preprocesses the corpus into `num_shards` TFRecord shards using a pool of
+# worker processes, each reading only its own byte range of the corpus.
+# Given the token `counts`, negatives are drawn with an `AliasSampler` built
+# from them; given a `sampling_table`, target words are subsampled with it
+# instead of the Zipf-based default. The shards are reused by later runs as
+# long as the corpus, the vocabulary and the generation parameters are
+# unchanged.
+def write_shards(path_to_file, out_dir, vocab, sequence_length, window_size,
+                 num_ns, seed, num_shards=None, processes=None, counts=None,
+                 sampling_table=None):
+  num_shards = num_shards or os.cpu_count()
+  table_hash = None
+  if sampling_table is not None:
+    table_hash = hashlib.sha256(np.asarray(sampling_table).tobytes()).hexdigest()
+  fingerprint = _fingerprint(path_to_file, vocab, sequence_length=sequence_length,
+                             window_size=window_size, num_ns=num_ns, seed=seed,
+                             num_shards=num_shards, split='bytes',
+                             unigram=counts is not None,
+                             sampling_table=table_hash)
+  meta_path = os.path.join(out_dir, 'meta.json')
+  if os.path.exists(meta_path):
+    with open(meta_path) as f:
+      meta = json.load(f)
+    if meta['fingerprint'] == fingerprint:
+      return meta
+
+  os.makedirs(out_dir, exist_ok=True)
+  for stale in glob.glob(os.path.join(out_dir, 'shard-*.tfrecord.gz')) + [meta_path]:
+    if os.path.exists(stale):
+      os.remove(stale)
+  with open(os.path.join(out_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(vocab))
+  if counts is not None:
+    np.save(os.path.join(out_dir, 'counts.npy'), counts)
+  if sampling_table is not None:
+    np.save(os.path.join(out_dir, 'sampling_table.npy'), sampling_table)
+  job = {'path_to_file': path_to_file, 'num_shards': num_shards,
+         'ranges': _byte_ranges(path_to_file, num_shards),
+         'unigram': counts is not None,
+         'subsample': sampling_table is not None,
+         'sequence_length': sequence_length, 'window_size': window_size,
+         'num_ns': num_ns, 'seed': seed}
+  with open(os.path.join(out_dir, 'job.json'), 'w') as f:
+    json.dump(job, f)
+
+  # The workers run as separate interpreters rather than through
+  # multiprocessing: TensorFlow is not fork-safe, and spawned children would
+  # re-run the calling notebook script, which has no main guard.
+  processes = min(processes or os.cpu_count(), num_shards)
+  workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), out_dir,
+                               str(worker), str(processes)])
+             for worker in range(processes)]
+  if any([worker.wait() != 0 for worker in workers]):
+    raise RuntimeError('preprocessing worker failed, see its output above')
+
+  meta = {'fingerprint': fingerprint, 'num_ns': num_ns,
+          'shards': [SHARD_PATTERN.format(i) for i in range(num_shards)]}
+  with open(meta_path, 'w') as f:
+    json.dump(meta, f, indent=2)
+  return meta
+
+
+# Reads the shards back with a parallel interleave and yields shuffled,
+# batched ((target, context), label) examples.
+def read_shards(out_dir, batch_size, buffer_size):
+  with open(os.path.join(out_dir, 'meta.json')) as f:
+    meta = json.load(f)
+  files = [os.path.join(out_dir, name) for name in meta['shards']]
+  labels = tf.constant([1] + [0] * meta['num_ns'], dtype=tf.int64)
+
+  def to_example(row):
+    return (row[0], row[1:]), labels
+
+  return (tf.data.Dataset.from_tensor_slices(files)
+          .interleave(lambda f: tf.data.TFRecordDataset(f, compression_type='GZIP'),
+                      cycle_length=tf.data.AUTOTUNE,
+                      num_parallel_calls=tf.data.AUTOTUNE,
+                      deterministic=False)
+          # parse_tensor loses the static shape, which Word2Vec.call needs
+          .map(lambda record: tf.reshape(tf.io.parse_tensor(record, tf.int64),
+                                         [-1, meta['num_ns'] + 2]),
+               num_parallel_calls=tf.data.AUTOTUNE)
+          .unbatch()
+          .map(to_example, num_parallel_calls=tf.data.AUTOTUNE)
+          .shuffle(buffer_size)
+          .batch(batch_size, drop_remainder=True)
+          .prefetch(tf.data.AUTOTUNE))
+
+
+# Worker entry point: `python w2v_shards.py OUT_DIR WORKER WORKERS` writes
+# shards WORKER, WORKER + WORKERS, ... of the job described in OUT_DIR.
+if __name__ == '__main__':
+  out_dir, worker, workers = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+  with open(os.path.join(out_dir, 'job.json')) as f:
+    job = json.load(f)
+  with open(os.path.join(out_dir, 'vocab.txt'), encoding='utf-8') as f:
+    vocab = f.read().split('\n')
+  sampler = None
+  if job['unigram']:
+    sampler = AliasSampler(np.load(os.path.join(out_dir, 'counts.npy')))
+  table = None
+  if job['subsample']:
+    table = np.load(os.path.join(out_dir, 'sampling_table.npy'))
+  for index in range(worker, job['num_shards'], workers):
+    start, end = job['ranges'][index]
+    _write_shard(index, job['path_to_file'], out_dir, start, end, vocab,
+                 job['sequence_length'], job['window_size'], job['num_ns'], job['seed'],
+                 negative_sampler=sampler, sampling_table=table)
@@ -0,0 +1,64 @@
+"""Streaming skip-gram pipeline for word2vec.py, built from tf.data ops."""
+
+import numpy as np
+import tensorflow as tf
+
+from w2v_data import make_sampling_table
+
+
+# Graph version of `w2v_data.skipgram_pairs` for a batch of padded
+# sequences of shape (batch, sequence_length).
+def skipgram_pairs_tf(sequences, window_size, sampling_table):
+  sequences = tf.cast(sequences, tf.int64)
+  keep = tf.logical_and(
+      sequences != 0,
+      tf.random.uniform(tf.shape(sequences)) < tf.gather(sampling_table, sequences))
+
+  targets, contexts = [], []
+  for offset in range(1, window_size + 1):
+    for target, context, mask in (
+        (sequences[:, :-offset], sequences[:, offset:], keep[:, :-offset]),
+        (sequences[:, offset:], sequences[:, :-offset], keep[:, offset:])):
+      mask = tf.logical_and(mask, context != 0)
+      targets.append(tf.boolean_mask(target, mask))
+      contexts.append(tf.boolean_mask(context, mask))
+  return tf.concat(targets, 0), tf.concat(contexts, 0)
+
+
+# Log-uniform negatives drawn by inverting the CDF, one row per pair.
+# Unlike the eager sampler, candidates within a row are not forced to be
+# distinct.
+def log_uniform_negatives_tf(n, num_ns, vocab_size):
+  u = tf.random.uniform((n, num_ns), dtype=tf.float64)
+  ids = tf.cast(tf.exp(u * np.log(vocab_size + 1)), tf.int64) - 1
+  return tf.minimum(ids, vocab_size - 1)
+
+
+# Turns a dataset of vectorized sentence batches into shuffled, batched
+# ((target, context), label) examples. Skip-grams and negatives are
+# generated inside the tf.data graph with `num_parallel_calls`, so batches
+# are produced as soon as the first sentences are read and memory is
+# bounded by the shuffle buffer rather than by the corpus size.
+def make_skipgram_dataset(vector_batches, window_size, num_ns, vocab_size,
+                          batch_size, buffer_size, sampling_table=None,
+                          negative_sampler=None):
+  if sampling_table is None:
+    sampling_table = make_sampling_table(vocab_size)
+  sampling_table = tf.constant(sampling_table, dtype=tf.float32)
+  if negative_sampler is None:
+    negative_sampler = lambda n: log_uniform_negatives_tf(n, num_ns, vocab_size)
+  labels = tf.constant([1] + [0] * num_ns, dtype=tf.int64)
+
+  def to_examples(sequences):
+    targets, contexts = skipgram_pairs_tf(sequences, window_size, sampling_table)
+    n = tf.shape(targets)[0]
+    negatives = negative_sampler(n)
+    contexts = tf.concat([contexts[:, None], negatives], axis=1)
+    return (targets, contexts), tf.tile(labels[None, :], [n, 1])
+
+  return (vector_batches
+          .map(to_examples, num_parallel_calls=tf.data.AUTOTUNE)
+          .unbatch()
+          .shuffle(buffer_size)
+          .batch(batch_size, drop_remainder=True)
+          .prefetch(tf.data.AUTOTUNE))
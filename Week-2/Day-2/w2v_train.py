@@ -0,0 +1,95 @@
+"""Custom training loop with row-sparse embedding updates for word2vec.py."""
+
+import time
+
+import tensorflow as tf
+
+
+# Adam that only touches the embedding rows present in a batch. Keras' Adam
+# decays its moment slots densely on every step, so each step costs
+# O(vocab_size * embedding_dim) even though a batch only looks up a few
+# thousand rows. Here the gradient of an embedding lookup stays an
+# IndexedSlices: its duplicate rows are summed and the moments and weights
+# of just those rows are updated (the "lazy" Adam variant). Dense gradients
+# get the regular Adam update.
+class SparseAdam:
+
+  def __init__(self, variables, learning_rate=1e-3, beta_1=0.9, beta_2=0.999,
+               epsilon=1e-7):
+    self.learning_rate = learning_rate
+    self.beta_1 = beta_1
+    self.beta_2 = beta_2
+    self.epsilon = epsilon
+    self.step = tf.Variable(0, dtype=tf.int64, trainable=False)
+    self.m = [tf.Variable(tf.zeros_like(v), trainable=False) for v in variables]
+    self.v = [tf.Variable(tf.zeros_like(v), trainable=False) for v in variables]
+
+  def apply_gradients(self, grads_and_vars):
+    self.step.assign_add(1)
+    t = tf.cast(self.step, tf.float32)
+    lr = self.learning_rate * tf.sqrt(1 - self.beta_2 ** t) / (1 - self.beta_1 ** t)
+    for (grad, var), m, v in zip(grads_and_vars, self.m, self.v):
+      if isinstance(grad, tf.IndexedSlices):
+        rows, position = tf.unique(grad.indices)
+        values = tf.math.unsorted_segment_sum(grad.values, position, tf.shape(rows)[0])
+        m_rows = self.beta_1 * tf.gather(m, rows) + (1 - self.beta_1) * values
+        v_rows = self.beta_2 * tf.gather(v, rows) + (1 - self.beta_2) * tf.square(values)
+        m.scatter_update(tf.IndexedSlices(m_rows, rows))
+        v.scatter_update(tf.IndexedSlices(v_rows, rows))
+        var.scatter_sub(tf.IndexedSlices(lr * m_rows / (tf.sqrt(v_rows) + self.epsilon), rows))
+      else:
+        m.assign(self.beta_1 * m + (1 - self.beta_1) * grad)
+        v.assign(self.beta_2 * v + (1 - self.beta_2) * tf.square(grad))
+        var.assign_sub(lr * m / (tf.sqrt(v) + self.epsilon))
+
+
+# Plain SGD applied as a scatter on the rows of a sparse gradient.
+class SparseSGD:
+
+  def __init__(self, variables, learning_rate=0.1):
+    self.learning_rate = learning_rate
+
+  def apply_gradients(self, grads_and_vars):
+    for grad, var in grads_and_vars:
+      if isinstance(grad, tf.IndexedSlices):
+        var.scatter_sub(tf.IndexedSlices(self.learning_rate * grad.values, grad.indices))
+      else:
+        var.assign_sub(self.learning_rate * grad)
+
+
+# Trains `model` on a dataset of ((target, context), label) batches with a
+# compiled train step, printing loss, accuracy and examples/sec per epoch.
+# `optimizer` is a class taking the model's trainable variables, e.g.
+# SparseAdam or SparseSGD. The model must already be built.
+def train_sparse(model, dataset, epochs, optimizer=SparseAdam, **optimizer_args):
+  variables = model.trainable_variables
+  opt = optimizer(variables, **optimizer_args)
+  loss_fn = tf.keras.losses.CategoricalCrossentropy(from_logits=True)
+
+  @tf.function
+  def train_step(pair, labels):
+    with tf.GradientTape() as tape:
+      logits = model(pair, training=True)
+      loss = loss_fn(tf.cast(labels, tf.float32), logits)
+    grads = tape.gradient(loss, variables)
+    opt.apply_gradients(zip(grads, variables))
+    correct = tf.equal(tf.argmax(logits, axis=1), tf.argmax(labels, axis=1))
+    return loss, tf.reduce_sum(tf.cast(correct, tf.int64))
+
+  history = []
+  for epoch in range(epochs):
+    start = time.perf_counter()
+    examples, correct, total_loss, steps = 0, 0, 0.0, 0
+    for pair, labels in dataset:
+      loss, batch_correct = train_step(pair, labels)
+      examples += int(labels.shape[0])
+      correct += int(batch_correct)
+      total_loss += float(loss)
+      steps += 1
+    seconds = time.perf_counter() - start
+    stats = {'loss': total_loss / max(steps, 1), 'accuracy': correct / max(examples, 1),
+             'examples_per_sec': examples / seconds}
+    history.append(stats)
+    print('Epoch {}/{} - loss: {loss:.4f} - accuracy: {accuracy:.4f} - '
+          '{examples_per_sec:.0f} examples/sec'.format(epoch + 1, epochs, **stats))
+  return history
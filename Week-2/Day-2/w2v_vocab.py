@@ -0,0 +1,96 @@
+"""Counted vocabulary and frequent-word subsampling stage for word2vec.py."""
+
+import collections
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+PAD, OOV = '', '[UNK]'
+
+
+# Mikolov et al.'s subsampling, as implemented in the word2vec tool: a word
+# with corpus frequency f is kept with probability (sqrt(f / t) + 1) * t / f,
+# so words much more frequent than the threshold t are mostly dropped.
+def subsampling_probabilities(counts, threshold=1e-5):
+  counts = np.asarray(counts, dtype=np.float64)
+  freq = counts / counts.sum()
+  keep = np.ones_like(freq)
+  seen = freq > 0
+  keep[seen] = (np.sqrt(freq[seen] / threshold) + 1) * threshold / freq[seen]
+  return np.minimum(keep, 1.0)
+
+
+# Names the standardization function and, when its source is available,
+# hashes it, so editing the function invalidates the cached vocabulary.
+def _function_id(fn):
+  name = '{}.{}'.format(getattr(fn, '__module__', None), getattr(fn, '__qualname__', repr(fn)))
+  try:
+    source = inspect.getsource(fn)
+  except (OSError, TypeError):
+    return name
+  return '{}:{}'.format(name, hashlib.sha256(source.encode()).hexdigest())
+
+
+def _fingerprint(path_to_file, **params):
+  stat = os.stat(path_to_file)
+  h = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+  h.update('{}:{}:{}'.format(os.path.abspath(path_to_file), stat.st_size, stat.st_mtime).encode())
+  return h.hexdigest()
+
+
+# Counts every standardized token of the corpus in one streaming pass and
+# keeps the `vocab_size - 2` most frequent ones after the padding and OOV
+# tokens, in the order `TextVectorization.get_vocabulary()` uses. Returns
+# the vocabulary, the count of every id (the OOV id counts all dropped
+# tokens) and the subsampling keep probability of every id. The result is
+# stored in `out_dir` and reused while the corpus, the parameters and the
+# `standardize` function match, so later runs skip the counting pass.
+def build_vocabulary(path_to_file, vocab_size, standardize, out_dir='w2v_vocab',
+                     threshold=1e-5, batch_size=4096):
+  fingerprint = _fingerprint(path_to_file, vocab_size=vocab_size, threshold=threshold,
+                             standardize=_function_id(standardize))
+  meta_path = os.path.join(out_dir, 'meta.json')
+  if os.path.exists(meta_path):
+    with open(meta_path) as f:
+      meta = json.load(f)
+    if meta['fingerprint'] == fingerprint:
+      return load_vocabulary(out_dir)
+
+  tokens_ds = (tf.data.TextLineDataset(path_to_file)
+               .batch(batch_size)
+               .map(lambda lines: tf.strings.split(standardize(lines)).flat_values,
+                    num_parallel_calls=tf.data.AUTOTUNE))
+  counter = collections.Counter()
+  for tokens in tokens_ds.as_numpy_iterator():
+    # Count each batch with NumPy so Python only touches distinct tokens
+    words, counts = np.unique(tokens, return_counts=True)
+    counter.update(dict(zip(words, counts.tolist())))
+
+  ranked = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+  kept = ranked[:vocab_size - 2]
+  vocab = [PAD, OOV] + [word.decode('utf-8') for word, _ in kept]
+  counts = np.array([0, sum(c for _, c in ranked[vocab_size - 2:])] + [c for _, c in kept],
+                    dtype=np.int64)
+  keep_prob = subsampling_probabilities(counts, threshold)
+
+  os.makedirs(out_dir, exist_ok=True)
+  with open(os.path.join(out_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+    f.write('\n'.join(vocab))
+  np.save(os.path.join(out_dir, 'counts.npy'), counts)
+  np.save(os.path.join(out_dir, 'keep_prob.npy'), keep_prob)
+  with open(meta_path, 'w') as f:
+    json.dump({'fingerprint': fingerprint, 'vocab_size': len(vocab),
+               'tokens': int(counts.sum()), 'threshold': threshold}, f, indent=2)
+  return {'vocab': vocab, 'counts': counts, 'keep_prob': keep_prob}
+
+
+def load_vocabulary(out_dir='w2v_vocab'):
+  with open(os.path.join(out_dir, 'vocab.txt'), encoding='utf-8') as f:
+    vocab = f.read().split('\n')
+  return {'vocab': vocab,
+          'counts': np.load(os.path.join(out_dir, 'counts.npy')),
+          'keep_prob': np.load(os.path.join(out_dir, 'keep_prob.npy'))}
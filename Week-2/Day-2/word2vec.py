@@ -80,8 +80,6 @@ In the next section, you'll generate skip-grams and negative samples for a singl
 """
 
 import io
-import re
-import string
 import tqdm
 
 import numpy as np
@@ -89,6 +87,14 @@ import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers
 
+from w2v_data import AliasSampler, generate_training_data_fast
+from w2v_export import export_embeddings, export_word2vec_binary, load_embeddings
+from w2v_index import IVFIndex, benchmark
+from w2v_shards import custom_standardization, read_shards, write_shards
+from w2v_stream import make_skipgram_dataset
+from w2v_train import SparseAdam, train_sparse
+from w2v_vocab import build_vocabulary
+
 # Commented out IPython magic to ensure Python compatibility.
 # Load the TensorBoard notebook extension
 # %load_ext tensorboard
@@ -96,6 +102,14 @@ from tensorflow.keras import layers
 SEED = 42
 AUTOTUNE = tf.data.AUTOTUNE
 
+# How the training examples are produced:
+#   'memory'    - generated in memory from a list of all sentences
+#   'streaming' - generated inside the tf.data pipeline
+#                 (see "Stream the training examples")
+#   'shards'    - preprocessed by worker processes into TFRecord shards
+#                 (see "Preprocess large corpora into shards")
+DATA_MODE = 'memory'
+
 """### Vectorize an example sentence
 
 Consider the following sentence:    
@@ -313,12 +327,9 @@ text_ds = tf.data.TextLineDataset(path_to_file).filter(lambda x: tf.cast(tf.stri
 You can use the `TextVectorization` layer to vectorize sentences from the corpus. Learn more about using this layer in this [Text Classification](https://www.tensorflow.org/tutorials/keras/text_classification) tutorial. Notice from the first few sentences above that the text needs to be in one case and punctuation needs to be removed. To do this, define a `custom_standardization function` that can be used in the TextVectorization layer.
 """
 
-# Now, create a custom standardization function to lowercase the text and
-# remove punctuation.
-def custom_standardization(input_data):
-  lowercase = tf.strings.lower(input_data)
-  return tf.strings.regex_replace(lowercase,
-                                  '[%s]' % re.escape(string.punctuation), '')
+# The custom standardization function lowercases the text and removes
+# punctuation. It is imported from w2v_shards.py, so the vocabulary, this
+# layer and the shard workers all standardize the text the same way.
 
 
 # Define the vocabulary size and number of words in a sequence.
@@ -333,13 +344,13 @@ vectorize_layer = layers.experimental.preprocessing.TextVectorization(
     output_mode='int',
     output_sequence_length=sequence_length)
 
-"""Call `adapt` on the text dataset to create vocabulary.
-
+"""Create the vocabulary. Calling `adapt` on the text dataset would do it, but it discards the token counts, which the later steps need for subsampling frequent words and for drawing negatives. `build_vocabulary()` from `w2v_vocab.py` counts every token in one streaming pass, keeps the `vocab_size` most frequent ones and computes the Mikolov subsampling probability of each. The vocabulary, counts and probabilities are saved to `w2v_vocab/`, so later runs on the same corpus skip the counting pass entirely. Set the vocabulary on the layer instead of adapting it.
 """
 
-vectorize_layer.adapt(text_ds.batch(1024))
+vocabulary = build_vocabulary(path_to_file, vocab_size, custom_standardization)
+vectorize_layer.set_vocabulary(vocabulary['vocab'][2:])
 
-"""Once the state of the layer has been adapted to represent the text corpus, the vocabulary can be accessed with `get_vocabulary()`. This function returns a list of all vocabulary tokens sorted (descending) by their frequency. """
+"""Once the vocabulary is set, it can be accessed with `get_vocabulary()`. This function returns a list of all vocabulary tokens sorted (descending) by their frequency. """
 
 # Save the created vocabulary for reference.
 inverse_vocab = vectorize_layer.get_vocabulary()
@@ -350,6 +361,67 @@ print(inverse_vocab[:20])
 # Vectorize the data in text_ds.
 text_vector_ds = text_ds.batch(1024).prefetch(AUTOTUNE).map(vectorize_layer).unbatch()
 
+"""### Sample negatives from the real token frequencies
+
+`tf.random.log_uniform_candidate_sampler` assumes that token ids follow a Zipf distribution, which is only an approximation of the corpus. The word2vec papers draw negatives from the actual unigram distribution raised to the power 0.75. Build an `AliasSampler` from the token counts collected with the vocabulary. Its alias (Walker) table is built once, and each negative then costs two random numbers and a table lookup. It can be used from NumPy (`negative_sampler.sample`) and inside a `tf.data` pipeline (`negative_sampler.tf_sampler`). Set `UNIGRAM_NEGATIVES = False` to keep the log-uniform sampler.
+"""
+
+UNIGRAM_NEGATIVES = True
+
+negative_sampler = None
+token_counts = None
+if UNIGRAM_NEGATIVES:
+  token_counts = vocabulary['counts']
+  negative_sampler = AliasSampler(token_counts)
+  print(negative_sampler.sample((2, 4), np.random.default_rng(SEED)))
+
+"""### Subsample frequent words
+
+`make_sampling_table` approximates word frequencies with a Zipf distribution of the ranks. Use the subsampling probabilities computed from the actual counts instead, so frequent tokens stop dominating the generated pairs. Every data mode below drops target words with these probabilities before generating pairs.
+"""
+
+sampling_table = vocabulary['keep_prob']
+print(sampling_table[:10])
+
+"""### Stream the training examples
+
+The steps below collect every sentence and every training example in Python lists and NumPy arrays before training, so the whole training set sits in memory several times over. With `DATA_MODE = 'streaming'` those steps are skipped and `make_skipgram_dataset()` from `w2v_stream.py` generates skip-grams and negative samples inside the `tf.data` graph instead, using `map` with `num_parallel_calls`. Batches are emitted as soon as the first sentences are vectorized and memory is bounded by the shuffle buffer, whatever the size of the corpus.
+"""
+
+BATCH_SIZE = 1024
+BUFFER_SIZE = 10000
+
+if DATA_MODE == 'streaming':
+  dataset = make_skipgram_dataset(
+      text_ds.batch(1024).map(vectorize_layer, num_parallel_calls=AUTOTUNE),
+      window_size=2,
+      num_ns=4,
+      vocab_size=vocab_size,
+      batch_size=BATCH_SIZE,
+      buffer_size=BUFFER_SIZE,
+      sampling_table=sampling_table,
+      negative_sampler=negative_sampler.tf_sampler(num_ns=4) if negative_sampler else None)
+  print(dataset)
+
+"""### Preprocess large corpora into shards
+
+For corpora far larger than `shakespeare.txt`, vectorization and skip-gram generation become a single-core bottleneck. With `DATA_MODE = 'shards'`, `write_shards()` from `w2v_shards.py` splits the corpus into byte ranges that start on line boundaries and hands each one to a separate worker process, so every worker reads only its own part of the file. The worker encodes its lines with the vocabulary, generates their examples and writes them as a compressed TFRecord file. Training then reads the shards with a parallel interleave. The shards are kept in `w2v_tfrecords/` and reused by later runs as long as the corpus, the vocabulary and the parameters are unchanged.
+"""
+
+if DATA_MODE == 'shards':
+  write_shards(
+      path_to_file,
+      'w2v_tfrecords',
+      vocab=inverse_vocab,
+      sequence_length=sequence_length,
+      window_size=2,
+      num_ns=4,
+      seed=SEED,
+      counts=token_counts,
+      sampling_table=sampling_table)
+  dataset = read_shards('w2v_tfrecords', batch_size=BATCH_SIZE, buffer_size=BUFFER_SIZE)
+  print(dataset)
+
 """### Obtain sequences from the dataset
 
 You now have a `tf.data.Dataset` of integer encoded sentences. To prepare the dataset for training a Word2Vec model, flatten the dataset into a list of sentence vector sequences. This step is required as you would iterate over each sentence in the dataset to produce positive and negative examples. 
@@ -357,52 +429,55 @@ You now have a `tf.data.Dataset` of integer encoded sentences. To prepare the da
 Note: Since the `generate_training_data()` defined earlier uses non-TF python/numpy functions, you could also use a `tf.py_function` or `tf.numpy_function` with `tf.data.Dataset.map()`.
 """
 
-sequences = list(text_vector_ds.as_numpy_iterator())
-print(len(sequences))
+if DATA_MODE == 'memory':
+  sequences = list(text_vector_ds.as_numpy_iterator())
+  print(len(sequences))
 
 """Take a look at few examples from `sequences`.
 
 """
 
-for seq in sequences[:5]:
-  print(f"{seq} => {[inverse_vocab[i] for i in seq]}")
+if DATA_MODE == 'memory':
+  for seq in sequences[:5]:
+    print(f"{seq} => {[inverse_vocab[i] for i in seq]}")
 
 """### Generate training examples from sequences
 
-`sequences` is now a list of int encoded sentences. Just call the `generate_training_data()` function defined earlier to generate training examples for the Word2Vec model. To recap, the function iterates over each word from each sequence to collect positive and negative context words. Length of target, contexts and labels should be same, representing the total number of training examples.
-"""
+`sequences` is now a list of int encoded sentences. The `generate_training_data()` function defined earlier iterates over each word from each sequence to collect positive and negative context words, but it runs several TensorFlow ops eagerly for every single skip-gram pair, which takes minutes on this corpus and hours on larger ones.
 
-targets, contexts, labels = generate_training_data(
-    sequences=sequences,
-    window_size=2,
-    num_ns=4,
-    vocab_size=vocab_size,
-    seed=SEED)
-
-targets = np.array(targets)
-contexts = np.array(contexts)[:,:,0]
-labels = np.array(labels)
+`generate_training_data_fast()` from `w2v_data.py` produces the same kind of examples with NumPy array operations instead: the positive pairs of a whole block of sentences are generated at once for each window offset, and the negatives of all pairs come from one vectorized draw of the same log-uniform distribution. Length of target, contexts and labels should be same, representing the total number of training examples.
+"""
 
-print('\n')
-print(f"targets.shape: {targets.shape}")
-print(f"contexts.shape: {contexts.shape}")
-print(f"labels.shape: {labels.shape}")
+if DATA_MODE == 'memory':
+  targets, contexts, labels = generate_training_data_fast(
+      sequences=np.array(sequences),
+      window_size=2,
+      num_ns=4,
+      vocab_size=vocab_size,
+      seed=SEED,
+      sampling_table=sampling_table,
+      negative_sampler=negative_sampler)
+
+  print('\n')
+  print(f"targets.shape: {targets.shape}")
+  print(f"contexts.shape: {contexts.shape}")
+  print(f"labels.shape: {labels.shape}")
 
 """### Configure the dataset for performance
 
 To perform efficient batching for the potentially large number of training examples, use the `tf.data.Dataset` API. After this step, you would have a `tf.data.Dataset` object of `(target_word, context_word), (label)` elements to train your Word2Vec model!
 """
 
-BATCH_SIZE = 1024
-BUFFER_SIZE = 10000
-dataset = tf.data.Dataset.from_tensor_slices(((targets, contexts), labels))
-dataset = dataset.shuffle(BUFFER_SIZE).batch(BATCH_SIZE, drop_remainder=True)
-print(dataset)
+if DATA_MODE == 'memory':
+  dataset = tf.data.Dataset.from_tensor_slices(((targets, contexts), labels))
+  dataset = dataset.shuffle(BUFFER_SIZE).batch(BATCH_SIZE, drop_remainder=True)
+  print(dataset)
 
-"""Add `cache()` and `prefetch()` to improve performance."""
+"""Add `cache()` and `prefetch()` to improve performance. The streaming dataset is not cached, since caching it would hold the whole training set in memory again."""
 
-dataset = dataset.cache().prefetch(buffer_size=AUTOTUNE)
-print(dataset)
+if DATA_MODE == 'memory':
+  dataset = dataset.cache().prefetch(buffer_size=AUTOTUNE)
+  print(dataset)
 
 """## Model and Training
 
@@ -471,9 +546,19 @@ word2vec.compile(optimizer='adam',
 
 tensorboard_callback = tf.keras.callbacks.TensorBoard(log_dir="logs")
 
-"""Train the model with `dataset` prepared above for some number of epochs."""
+"""Train the model with `dataset` prepared above for some number of epochs.
+
+`model.fit` with Adam keeps dense moment slots for both embedding tables and updates all of them on every step, although a batch only touches a few thousand rows. With `SPARSE_TRAINING = True`, `train_sparse()` from `w2v_train.py` runs a compiled custom training loop instead. The embedding gradients stay row-sparse (`IndexedSlices`) and `SparseAdam` updates only the rows present in the batch, so a step costs time in proportion to the batch rather than to `vocab_size × embedding_dim`. It prints examples/sec for every epoch. TensorBoard logging is only available with `fit`.
+"""
+
+SPARSE_TRAINING = False
 
-word2vec.fit(dataset, epochs=20, callbacks=[tensorboard_callback])
+if SPARSE_TRAINING:
+  # Build the variables before the optimizer creates its slots.
+  word2vec((tf.zeros([1], tf.int64), tf.zeros([1, num_ns + 1], tf.int64)))
+  train_sparse(word2vec, dataset, epochs=20, optimizer=SparseAdam)
+else:
+  word2vec.fit(dataset, epochs=20, callbacks=[tensorboard_callback])
 
 """Tensorboard now shows the Word2Vec model's accuracy and loss."""
 
@@ -505,7 +590,28 @@ for index, word in enumerate(vocab):
 out_v.close()
 out_m.close()
 
-"""Download the `vectors.tsv` and `metadata.tsv` to analyze the obtained embeddings in the [Embedding Projector](https://projector.tensorflow.org/)."""
+"""Download the `vectors.tsv` and `metadata.tsv` to analyze the obtained embeddings in the [Embedding Projector](https://projector.tensorflow.org/).
+
+The TSV files are convenient for the projector, but formatting every float as text is slow and produces huge files for large vocabularies. For services that load the embeddings, `w2v_export.py` writes binary formats instead. `export_embeddings()` writes the raw float32 (or float16) matrix and a vocabulary index as `.npy` files that `load_embeddings()` memory-maps, so even a 1M x 300 table opens in milliseconds. `export_word2vec_binary()` writes the standard binary format of the original word2vec tool.
+"""
+
+export_embeddings(weights, vocab, 'w2v_embedding')
+export_word2vec_binary(weights, vocab, 'w2v_embedding.bin')
+
+embeddings = load_embeddings('w2v_embedding')
+print(embeddings.vectors.shape, embeddings.index(vocab[2]))
+
+"""## Nearest-neighbour lookups
+
+To look up similar words in production, build an `IVFIndex` from `w2v_index.py` over the `w2v_embedding` weights. It clusters the normalized vectors with k-means and answers a batch of top-k cosine queries by scanning only the `n_probe` clusters closest to each query. `benchmark()` compares its recall and queries per second with brute-force matrix multiplication on the same queries. Padding (index 0) is left out of the index.
+"""
+
+index = IVFIndex(weights[1:])
+queries = weights[1:1001]
+print(benchmark(index, weights[1:], queries, k=10, n_probe=8))
+
+neighbours, _ = index.search(weights[vocab.index('king')], k=6)
+print([vocab[i + 1] for i in neighbours[0]])
 
 try:
   from google.colab import files
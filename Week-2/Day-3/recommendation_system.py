@@ -28,6 +28,7 @@ from tensorflow import keras
 from tensorflow.keras import layers
 from pathlib import Path
 import matplotlib.pyplot as plt
+from recommender_engine import RecommendationEngine, WatchedIndex
 
 """Data download"""
 
@@ -123,7 +124,9 @@ class RecommenderNet(keras.Model):
         user_bias = self.user_bias(inputs[:, 0])
         movie_vector = self.movie_embedding(inputs[:, 1])
         movie_bias = self.movie_bias(inputs[:, 1])
-        dot_user_movie = tf.tensordot(user_vector, movie_vector, 2)
+        # Per-row dot product; tf.tensordot(..., 2) would also contract the
+        # batch axis and give one scalar for the whole batch
+        dot_user_movie = tf.reduce_sum(user_vector * movie_vector, axis=1, keepdims=True)
         # Add all the components (including bias)
         x = dot_user_movie + user_bias + movie_bias
         # The sigmoid activation forces the rating to between 0 and 1
@@ -158,35 +161,28 @@ plt.show()
 
 movie_df = pd.read_csv(movielens_dir / "movies.csv")
 
+# Index the movies each user watched once, instead of filtering the whole
+# ratings table for every user we recommend to
+watched_index = WatchedIndex.from_ratings(df, num_users)
+
 # Let us get a user and see the top recommendations.
 user_id = df.userId.sample(1).iloc[0]
-movies_watched_by_user = df[df.userId == user_id]
-movies_not_watched = movie_df[
-    ~movie_df["movieId"].isin(movies_watched_by_user.movieId.values)
-]["movieId"]
-movies_not_watched = list(
-    set(movies_not_watched).intersection(set(movie2movie_encoded.keys()))
-)
-movies_not_watched = [[movie2movie_encoded.get(x)] for x in movies_not_watched]
 user_encoder = user2user_encoded.get(user_id)
-user_movie_array = np.hstack(
-    ([[user_encoder]] * len(movies_not_watched), movies_not_watched)
-)
-ratings = model.predict(user_movie_array).flatten()
-top_ratings_indices = ratings.argsort()[-10:][::-1]
-recommended_movie_ids = [
-    movie_encoded2movie.get(movies_not_watched[x][0]) for x in top_ratings_indices
-]
+
+# Score the user against every movie with one matrix multiply instead of
+# model.predict on a stacked (user, movie) array, leaving out watched movies
+engine = RecommendationEngine(model)
+top_movies, top_ratings = engine.recommend([user_encoder], k=10, watched=watched_index)
+recommended_movie_ids = [movie_encoded2movie.get(x) for x in top_movies[0]]
 
 print("Showing recommendations for user: {}".format(user_id))
 print("====" * 9)
 print("Movies with high ratings from user")
 print("----" * 8)
-top_movies_user = (
-    movies_watched_by_user.sort_values(by="rating", ascending=False)
-    .head(5)
-    .movieId.values
-)
+top_watched = watched_index.watched(user_encoder)[
+    np.argsort(-watched_index.user_ratings(user_encoder), kind="stable")[:5]
+]
+top_movies_user = [movie_encoded2movie.get(x) for x in top_watched]
 movie_df_rows = movie_df[movie_df["movieId"].isin(top_movies_user)]
 for row in movie_df_rows.itertuples():
     print(row.title, ":", row.genres)
@@ -198,6 +194,11 @@ recommended_movies = movie_df[movie_df["movieId"].isin(recommended_movie_ids)]
 for row in recommended_movies.itertuples():
     print(row.title, ":", row.genres)
 
+"""recommendations for every user in one pass"""
+
+all_top_movies, all_top_ratings = engine.recommend(k=10, watched=watched_index)
+print(all_top_movies.shape)
+
 """Transformer-Based Recommendation System ([Behavior Sequence Transformer (BST)](https://arxiv.org/abs/1905.06874))"""
 
 urlretrieve("http://files.grouplens.org/datasets/movielens/ml-1m.zip", "movielens.zip")
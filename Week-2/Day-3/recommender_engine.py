@@ -0,0 +1,97 @@
+"""Batched top-k recommendations from a trained RecommenderNet."""
+
+import numpy as np
+
+
+class WatchedIndex:
+    """CSR index of the movies each user rated.
+
+    `offsets[u]:offsets[u + 1]` is the slice of `movies` (sorted movie
+    indices) and `ratings` that belongs to user index u. It is built once
+    from the ratings table; afterwards masking the watched movies of a block
+    of users costs time proportional to their own ratings, not to the size
+    of the table.
+    """
+
+    def __init__(self, users, movies, ratings, num_users):
+        users = np.asarray(users)
+        order = np.lexsort((movies, users))
+        self.movies = np.asarray(movies)[order].astype(np.int32)
+        self.ratings = np.asarray(ratings)[order].astype(np.float32)
+        counts = np.bincount(users, minlength=num_users)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def from_ratings(cls, df, num_users):
+        return cls(df["user"].values, df["movie"].values, df["rating"].values, num_users)
+
+    def watched(self, user):
+        return self.movies[self.offsets[user]:self.offsets[user + 1]]
+
+    def user_ratings(self, user):
+        return self.ratings[self.offsets[user]:self.offsets[user + 1]]
+
+    def mask(self, users, scores):
+        """Set the scores of watched movies to -inf in place.
+
+        Row i of `scores` belongs to user index users[i].
+        """
+        users = np.asarray(users)
+        starts = self.offsets[users]
+        lengths = self.offsets[users + 1] - starts
+        rows = np.repeat(np.arange(len(users)), lengths)
+        # positions of every user's slice, concatenated without a Python loop
+        shift = starts - (np.cumsum(lengths) - lengths)
+        positions = np.arange(lengths.sum()) + np.repeat(shift, lengths)
+        scores[rows, self.movies[positions]] = -np.inf
+        return scores
+
+
+class RecommendationEngine:
+    """Scores users against every movie with one matrix multiply per block.
+
+    The predicted rating of RecommenderNet is
+    sigmoid(user . movie + user_bias + movie_bias). The sigmoid does not
+    change the ranking, so top-k is taken on the raw scores and the sigmoid
+    is only applied to the k returned values.
+    """
+
+    def __init__(self, model):
+        self.user_vectors = model.user_embedding.embeddings.numpy()
+        self.user_bias = model.user_bias.embeddings.numpy()[:, 0]
+        self.movie_vectors = model.movie_embedding.embeddings.numpy()
+        self.movie_bias = model.movie_bias.embeddings.numpy()[:, 0]
+
+    def scores(self, users):
+        users = np.asarray(users)
+        return (
+            self.user_vectors[users] @ self.movie_vectors.T
+            + self.user_bias[users, None]
+            + self.movie_bias[None, :]
+        )
+
+    def recommend(self, users=None, k=10, watched=None, block_size=1024):
+        """Top-k movie indices and predicted ratings for each user.
+
+        `users` defaults to every user. `watched` is a WatchedIndex whose
+        movies are left out of each user's recommendations. Users are
+        scored in blocks of `block_size` rows, so memory stays at
+        block_size x num_movies scores.
+        """
+        if users is None:
+            users = np.arange(len(self.user_vectors))
+        users = np.asarray(users)
+        k = min(k, len(self.movie_vectors))
+        top_movies = np.empty((len(users), k), dtype=np.int64)
+        top_scores = np.empty((len(users), k), dtype=np.float32)
+        for start in range(0, len(users), block_size):
+            block = users[start:start + block_size]
+            scores = self.scores(block)
+            if watched is not None:
+                watched.mask(block, scores)
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            part_scores = np.take_along_axis(scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1)
+            top_movies[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+            top_scores[start:start + len(block)] = np.take_along_axis(part_scores, order, axis=1)
+        return top_movies, 1 / (1 + np.exp(-top_scores))
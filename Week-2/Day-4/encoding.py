@@ -0,0 +1,74 @@
+import json
+import zlib
+import numpy as np
+import pandas as pd
+
+# Compact encodings for the categorical columns, so they can be used by the
+# forest without a dense one-hot matrix. Every column becomes a single small
+# integer column:
+#   ordinal - index of the category in the fitted category list
+#   target  - rank of the category by its smoothed positive rate
+#   hash    - crc32 of the category modulo a fixed number of buckets
+# Unknown categories encode to -1. The fitted encoder is a small JSON file.
+ENCODERS = 'encoders.json'
+ENCODINGS = {
+    'job': 'target',
+    'marital': 'ordinal',
+    'education': 'ordinal',
+    'contact': 'ordinal',
+    'month': 'ordinal',
+    'poutcome': 'target',
+}
+HASH_BUCKETS = 64
+
+
+def _int_dtype(n):
+    return np.int8 if n < 127 else np.int16 if n < 32767 else np.int32
+
+
+class CategoricalEncoder:
+
+    def __init__(self, columns=None):
+        self.columns = columns or {}
+
+    def fit(self, X, y, encodings=ENCODINGS, smoothing=10.0):
+        positive = np.asarray(y == 'yes', dtype=np.float64)
+        prior = positive.mean()
+        for col, method in encodings.items():
+            if method == 'hash':
+                self.columns[col] = {'method': 'hash', 'buckets': HASH_BUCKETS}
+                continue
+            categories = X[col].astype('category').cat.categories
+            if method == 'target':
+                stats = pd.Series(positive, index=X.index).groupby(X[col], observed=True).agg(['sum', 'count'])
+                rate = (stats['sum'] + smoothing * prior) / (stats['count'] + smoothing)
+                categories = rate.sort_values(kind='stable').index
+            elif method != 'ordinal':
+                raise ValueError('unknown encoding {!r} for {}'.format(method, col))
+            self.columns[col] = {'method': method, 'categories': [str(c) for c in categories]}
+        return self
+
+    def transform(self, X):
+        X = X.copy()
+        for col, spec in self.columns.items():
+            values = X[col].astype('category')
+            if spec['method'] == 'hash':
+                # Hash each distinct category once, then gather by code
+                buckets = np.array([zlib.crc32(str(c).encode()) % spec['buckets']
+                                    for c in values.cat.categories], dtype=np.int64)
+                codes = values.cat.codes.to_numpy()
+                encoded = np.where(codes >= 0, buckets[codes], -1)
+                X[col] = encoded.astype(_int_dtype(spec['buckets']))
+            else:
+                codes = values.cat.set_categories(spec['categories']).cat.codes
+                X[col] = codes.astype(_int_dtype(len(spec['categories'])))
+        return X
+
+    def save(self, path=ENCODERS):
+        with open(path, 'w') as f:
+            json.dump(self.columns, f, indent=2)
+
+    @classmethod
+    def load(cls, path=ENCODERS):
+        with open(path) as f:
+            return cls(json.load(f))
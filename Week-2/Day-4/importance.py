@@ -0,0 +1,58 @@
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+# Permutation importance on a stratified sample of the evaluation data. Each
+# round permutes every feature once, in parallel threads that share the model
+# and the sample (tree prediction releases the GIL, so nothing is copied into
+# worker processes). Rounds repeat until the time budget or max_repeats is
+# reached, and the spread of the repeats gives a confidence interval. The
+# cost is features x repeats x sample size, whatever the size of the data.
+
+
+def stratified_sample(X, y, n, seed=46):
+    # Draw about n rows, keeping the class proportions of y
+    if len(X) <= n:
+        return X, np.asarray(y)
+    rng = np.random.default_rng(seed)
+    y = np.asarray(y)
+    idx = []
+    for label in np.unique(y):
+        rows = np.flatnonzero(y == label)
+        k = max(1, int(round(n * len(rows) / len(y))))
+        idx.append(rng.choice(rows, size=min(k, len(rows)), replace=False))
+    idx = np.sort(np.concatenate(idx))
+    return X.iloc[idx], y[idx]
+
+
+def _score_permuted(model, X, y, col, seed):
+    X = X.copy()
+    X[col] = np.random.default_rng(seed).permutation(X[col].to_numpy())
+    return np.mean(model.predict(X) == y)
+
+
+def permutation_importance(model, X, y, sample_size=10000, time_budget=30.0,
+                           min_repeats=3, max_repeats=30, n_jobs=-1, seed=46):
+    X, y = stratified_sample(X, y, sample_size, seed)
+    baseline = np.mean(model.predict(X) == y)
+    drops = {col: [] for col in X.columns}
+
+    start = time.perf_counter()
+    with Parallel(n_jobs=n_jobs, prefer='threads') as parallel:
+        for repeat in range(max_repeats):
+            if repeat >= min_repeats and time.perf_counter() - start > time_budget:
+                break
+            scores = parallel(
+                delayed(_score_permuted)(model, X, y, col, seed + repeat * len(X.columns) + i)
+                for i, col in enumerate(X.columns))
+            for col, score in zip(X.columns, scores):
+                drops[col].append(baseline - score)
+
+    rows = []
+    for col, values in drops.items():
+        values = np.array(values)
+        # normal approximation of the 95% interval of the mean
+        ci = 1.96 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else np.nan
+        rows.append((col, values.mean(), ci, len(values)))
+    return pd.DataFrame(rows, columns=['feature', 'importance', 'ci95', 'repeats'])
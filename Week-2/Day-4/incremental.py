@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import numpy as np
+from prepare import read_bank
+
+# Incremental retraining state. The watermark records the byte offset of
+# the end of the last ingested row, so the next run reads only the rows
+# appended since then, in time proportional to the delta.
+WATERMARK = 'watermark.json'
+MIN_DELTA_ROWS = 50
+
+
+def load_watermark(data_path, path=WATERMARK):
+    # Byte offset to resume from and rows ingested so far; (0, 0) when there
+    # is no watermark or the data file was rewritten rather than appended to
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path) as f:
+        mark = json.load(f)
+    if mark['data'] != data_path or mark['offset'] > os.path.getsize(data_path):
+        return 0, 0
+    return mark['offset'], mark['rows']
+
+
+def save_watermark(data_path, offset, rows, path=WATERMARK):
+    with open(path, 'w') as f:
+        json.dump({'data': data_path, 'offset': offset, 'rows': rows}, f, indent=2)
+
+
+def read_since(data_path, offset):
+    # Return the rows between offset and the current end of the file, and
+    # the offset to store as the next watermark. Only the delta is read, and
+    # rows appended while reading are left for the next run.
+    end = os.path.getsize(data_path)
+    if offset == 0:
+        return read_bank(data_path), end
+    with open(data_path, 'rb') as f:
+        header = f.readline().decode().strip().split(';')
+        f.seek(offset)
+        delta = io.BytesIO(f.read(end - offset))
+    names = [name.strip('"') for name in header]
+    return read_bank(delta, names=names, header=None), end
+
+
+def can_refresh(model, y, min_rows=MIN_DELTA_ROWS):
+    # The new rows are split into train and test sets and the new trees
+    # must see every class, so a refresh needs a few rows of each class
+    counts = y.value_counts()
+    return len(y) >= min_rows and len(counts) == len(model.classes_) and counts.min() >= 2
+
+
+def refresh_forest(model, fresh):
+    # Add the trees of a forest fitted on the new rows and retire as many of
+    # the oldest trees, keeping the ensemble size constant
+    if not np.array_equal(model.classes_, fresh.classes_):
+        raise ValueError('the new rows do not contain every class')
+    n_new = len(fresh.estimators_)
+    if n_new >= len(model.estimators_):
+        raise ValueError('cannot replace {} of {} trees'.format(n_new, len(model.estimators_)))
+    model.estimators_ = model.estimators_[n_new:] + fresh.estimators_
+    return model
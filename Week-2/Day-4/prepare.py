@@ -0,0 +1,41 @@
+import pandas as pd
+
+# Declared layout of the bank campaign exports. Only the columns the model
+# uses are parsed, each straight into a compact dtype. yes/no columns are
+# parsed as a two-value categorical and decoded to int8 codes (no=0, yes=1).
+YES_NO = pd.CategoricalDtype(['no', 'yes'])
+SCHEMA = {
+    'age': 'int16',
+    'job': 'category',
+    'marital': 'category',
+    'education': 'category',
+    'default': YES_NO,
+    'balance': 'int32',
+    'housing': YES_NO,
+    'loan': YES_NO,
+    'contact': 'category',
+    'day': 'int8',
+    'month': 'category',
+    'duration': 'int32',
+    'campaign': 'int16',
+    'pdays': 'int16',
+    'previous': 'int16',
+    'poutcome': 'category',
+    'y': YES_NO,
+}
+BINARY_COLUMNS = ['default', 'housing', 'loan']
+USECOLS = list(SCHEMA)
+
+
+def read_bank(path, **kwargs):
+    # Columns outside USECOLS are skipped by the parser and never
+    # materialized; a missing 'y' column (unlabelled data) is fine
+    return pd.read_csv(path, delimiter=';', usecols=lambda col: col in USECOLS,
+                       dtype={col: SCHEMA[col] for col in USECOLS}, **kwargs)
+
+
+def prepare(df):
+    # decode yes/no features
+    for col in BINARY_COLUMNS:
+        df[col] = df[col].cat.codes.astype('int8')
+    return df
@@ -0,0 +1,118 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Report rendering for train.py. train.py only writes the numbers behind the
+# figures to report.json; the figures are rendered here with the headless Agg
+# backend, each in its own process so they are drawn concurrently. A figure is
+# skipped when its numbers did not change since it was last rendered, and
+# with --format json nothing is rendered (or imported) at all.
+REPORT = 'report.json'
+FORMATS = ('png', 'svg', 'json')
+
+axis_fs = 18 #fontsize
+title_fs = 22 #fontsize
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+def render_feature_importance(data, out):
+    import pandas as pd
+    plt, sns = _pyplot()
+    feature_df = pd.DataFrame(data)
+    sns.set(style="whitegrid")
+
+    ax = sns.barplot(x="importance", y="feature", data=feature_df)
+    ax.errorbar(feature_df['importance'], range(len(feature_df)), xerr=feature_df['ci95'],
+                fmt='none', ecolor='black')
+    ax.set_xlabel('Importance',fontsize = axis_fs)
+    ax.set_ylabel('Feature', fontsize = axis_fs)#ylabel
+    ax.set_title('Random forest\npermutation importance', fontsize = title_fs)
+
+    plt.tight_layout()
+    plt.savefig(out,dpi=120)
+    plt.close()
+
+
+def render_confusion_matrix(data, out):
+    import numpy as np
+    plt, sns = _pyplot()
+
+    cm = np.array(data['matrix'])
+    ax = sns.heatmap(cm, annot=True, fmt="d", cmap="Blues",
+                     xticklabels=data['labels'], yticklabels=data['labels'])
+    ax.set_xlabel('Predicted',fontsize = axis_fs)
+    ax.set_ylabel('True', fontsize = axis_fs)
+    ax.set_title('Confusion Matrix', fontsize = title_fs)
+
+    plt.tight_layout()
+    plt.savefig(out,dpi=120)
+    plt.close()
+
+
+RENDERERS = {
+    'feature_importance': render_feature_importance,
+    'confusion_matrix': render_confusion_matrix,
+}
+
+
+def _digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _up_to_date(out, digest):
+    stamp = out + '.sha256'
+    if not (os.path.exists(out) and os.path.exists(stamp)):
+        return False
+    with open(stamp) as f:
+        return f.read().strip() == digest
+
+
+def _render(name, data, out, digest):
+    RENDERERS[name](data, out)
+    with open(out + '.sha256', 'w') as f:
+        f.write(digest + '\n')
+
+
+def render_all(figures, fmt='png'):
+    # Render every out-of-date figure in parallel; returns the files written
+    if fmt == 'json':
+        return []
+    todo = []
+    for name, data in figures.items():
+        out = '{}.{}'.format(name, fmt)
+        digest = _digest(data)
+        if not _up_to_date(out, digest):
+            todo.append((name, data, out, digest))
+    if not todo:
+        return []
+    with ProcessPoolExecutor(max_workers=len(todo)) as pool:
+        futures = [pool.submit(_render, *args) for args in todo]
+        for future in futures:
+            future.result()
+    return [out for _, _, out, _ in todo]
+
+
+def write_report(figures, path=REPORT):
+    with open(path, 'w') as f:
+        json.dump(figures, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--report', default=REPORT)
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    args = parser.parse_args()
+
+    with open(args.report) as f:
+        figures = json.load(f)
+    rendered = render_all(figures, args.format)
+    print('Rendered: {}'.format(', '.join(rendered) or 'nothing, figures are up to date'))
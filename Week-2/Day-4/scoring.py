@@ -0,0 +1,62 @@
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import confusion_matrix
+from encoding import ENCODERS, CategoricalEncoder
+from prepare import prepare, read_bank
+
+
+class Scorer:
+    # Predicts each split exactly once and derives every metric from the
+    # cached predictions
+
+    def __init__(self, model):
+        self.model = model
+        self.splits = {}
+        self._predictions = {}
+
+    def add_split(self, name, X, y):
+        self.splits[name] = (X, np.asarray(y))
+        self._predictions.pop(name, None)
+
+    def predictions(self, name):
+        if name not in self._predictions:
+            X, _ = self.splits[name]
+            self._predictions[name] = self.model.predict(X)
+        return self._predictions[name]
+
+    def accuracy(self, name):
+        y = self.splits[name][1]
+        return np.mean(self.predictions(name) == y)
+
+    def confusion_matrix(self, name):
+        y = self.splits[name][1]
+        return confusion_matrix(y, self.predictions(name))
+
+
+def predict_csv(model, encoder, path, out, batch_size=100000):
+    # Score a large CSV in batches; only one batch is in memory at a time
+    rows = 0
+    reader = read_bank(path, chunksize=batch_size)
+    for i, chunk in enumerate(reader):
+        X = encoder.transform(prepare(chunk).drop(columns='y', errors='ignore'))
+        pred = pd.DataFrame({'y_pred': model.predict(X)}, index=chunk.index)
+        pred.to_csv(out, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv', help='campaign export in the bank-full.csv layout')
+    parser.add_argument('--model', default='model.joblib')
+    parser.add_argument('--encoders', default=ENCODERS)
+    parser.add_argument('--out', default='predictions.csv')
+    parser.add_argument('--batch-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    encoder = CategoricalEncoder.load(args.encoders)
+    rows = predict_csv(model, encoder, args.csv, args.out, args.batch_size)
+    print('Scored {} rows into {}'.format(rows, args.out))
@@ -1,72 +1,114 @@
-import pandas as pd
-from sklearn.metrics import confusion_matrix 
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+import argparse
+import joblib
+import os
+import subprocess
+import sys
+from encoding import ENCODERS, CategoricalEncoder
+from importance import permutation_importance
+from incremental import can_refresh, load_watermark, read_since, refresh_forest, save_watermark
+from prepare import prepare
+from report import FORMATS, write_report
+from scoring import Scorer
 
-# DATA PREPRARATION
-df = pd.read_csv('data/bank-full.csv', delimiter=';')
+parser = argparse.ArgumentParser()
+parser.add_argument('--incremental', action='store_true',
+                    help='update model.joblib with the rows added since the last run')
+parser.add_argument('--refresh-trees', type=int, default=20,
+                    help='trees trained on the new rows, replacing the oldest ones')
+parser.add_argument('--importance-sample', type=int, default=10000,
+                    help='rows of the test split used for permutation importance')
+parser.add_argument('--importance-budget', type=float, default=30.0,
+                    help='seconds spent on permutation importance repeats')
+parser.add_argument('--report-format', choices=FORMATS, default='png',
+                    help='json only writes report.json and skips rendering')
+args = parser.parse_args()
+
+DATA = 'data/bank-full.csv'
+incremental = args.incremental and os.path.exists('model.joblib')
 
-# Drop Columns
-df = df.drop(columns = ['job', 'marital', 'education','contact', 'month', 'poutcome'])
+# DATA PREPRARATION
+offset, rows = load_watermark(DATA) if incremental else (0, 0)
+if incremental and offset == 0:
+    # No usable watermark, so retrain on the whole history
+    incremental = False
+if incremental:
+    model = joblib.load('model.joblib')
+    if not 0 < args.refresh_trees < len(model.estimators_):
+        parser.error('--refresh-trees must be between 1 and {} for this model'.format(
+            len(model.estimators_) - 1))
+if offset >= os.path.getsize(DATA):
+    print('No new rows since the last run')
+    sys.exit()
+df, end = read_since(DATA, offset)
 
-# mapping features
-df['default'] = df['default'].map( 
-                   {'yes':1 ,'no':0}) 
-df['housing'] = df['housing'].map( 
-                   {'yes':1 ,'no':0}) 
-df['loan'] = df['loan'].map( 
-                   {'yes':1 ,'no':0}) 
+# map features
+df = prepare(df)
 
 # split dataset
 X = df.drop('y', axis=1)
 y = df['y']
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=46)
+if incremental and not can_refresh(model, y):
+    # Leave the watermark where it is, so these rows are used by a later run
+    print('The {} new rows are too few or miss a class; keeping them for the next run'.format(
+        len(y)))
+    sys.exit()
+# Incremental runs stratify, so the new trees see every class
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=46,
+                                                    stratify=y if incremental else None)
+
+# encode categorical features; the encoder is fitted on the training split
+# of a full run and reused by incremental runs, whose old trees rely on it
+if incremental:
+    encoder = CategoricalEncoder.load(ENCODERS)
+else:
+    encoder = CategoricalEncoder().fit(X_train, y_train)
+    encoder.save(ENCODERS)
+X_train = encoder.transform(X_train)
+X_test = encoder.transform(X_test)
 
 # MODELLING
-model = RandomForestClassifier(n_estimators=100, random_state=46)
-model.fit(X_train, y_train)
+if incremental:
+    fresh = RandomForestClassifier(n_estimators=args.refresh_trees, random_state=46)
+    fresh.fit(X_train, y_train)
+    model = refresh_forest(model, fresh)
+else:
+    model = RandomForestClassifier(n_estimators=100, random_state=46)
+    model.fit(X_train, y_train)
+joblib.dump(model, 'model.joblib')
+save_watermark(DATA, end, rows + len(df))
 
 # Model Report
-train_score = model.score(X_train, y_train) * 100
-test_score = model.score(X_test, y_test) * 100
+scorer = Scorer(model)
+scorer.add_split('train', X_train, y_train)
+scorer.add_split('test', X_test, y_test)
+train_score = scorer.accuracy('train') * 100
+test_score = scorer.accuracy('test') * 100
 
 # Create metrics score file as txt
 with open('metrics.txt', 'w') as f:
     f.write("Training Accuracy: {}\n".format(train_score))
     f.write("Testing Accuracy: {}\n".format(test_score))
 
-# Feature Importance Plot
-importances = model.feature_importances_
-labels = df.columns
-feature_df = pd.DataFrame(list(zip(labels, importances)), columns = ["feature","importance"])
+# Feature Importance
+feature_df = permutation_importance(model, X_test, y_test,
+                                    sample_size=args.importance_sample,
+                                    time_budget=args.importance_budget)
 feature_df = feature_df.sort_values('importance', ascending=False)
+feature_df.to_csv('feature_importance.csv', index=False)
 
-axis_fs = 18 #fontsize
-title_fs = 22 #fontsize
-sns.set(style="whitegrid")
-
-ax = sns.barplot(x="importance", y="feature", data=feature_df)
-ax.set_xlabel('Importance',fontsize = axis_fs) 
-ax.set_ylabel('Feature', fontsize = axis_fs)#ylabel
-ax.set_title('Random forest\nfeature importance', fontsize = title_fs)
-
-plt.tight_layout()
-plt.savefig("feature_importance.png",dpi=120) 
-plt.close()
-
-# Confusion Matrix Plot
-axis_fs = 18 #fontsize
-title_fs = 22 #fontsize
-
-cm = confusion_matrix(y_test, model.predict(X_test))
-ax = sns.heatmap(cm, annot=True, fmt="d", cmap="Blues")
-ax.set_xlabel('Predicted',fontsize = axis_fs)
-ax.set_ylabel('True', fontsize = axis_fs)
-ax.set_title('Confusion Matrix', fontsize = title_fs)
+# Confusion Matrix
+cm = scorer.confusion_matrix('test')
 
-plt.tight_layout()
-plt.savefig("confusion_matrix.png",dpi=120) 
-plt.close()
\ No newline at end of file
+# REPORT
+figures = {
+    'feature_importance': feature_df.to_dict(orient='list'),
+    'confusion_matrix': {'matrix': cm.tolist(), 'labels': [str(c) for c in model.classes_]},
+}
+write_report(figures)
+# Render in a separate report.py process: its worker pool must not be started
+# from this unguarded script, which spawn/forkserver workers would re-run
+if args.report_format != 'json':
+    report_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report.py')
+    subprocess.run([sys.executable, report_py, '--format', args.report_format], check=True)
@@ -0,0 +1,105 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+
+# Stage timings and throughput for train.py, written to metrics.json, plus a
+# `compare` command that fails when throughput regresses against a baseline.
+
+
+class Benchmark:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def rate(self, rows, *stages):
+        seconds = sum(self.stages.get(s, 0.0) for s in stages)
+        return rows / seconds if seconds else None
+
+    def write(self, path, train_rows, test_rows, **metrics):
+        report = dict(
+            metrics,
+            stages=self.stages,
+            peak_rss_mb=peak_rss_mb(),
+            train_rows=train_rows,
+            test_rows=test_rows,
+            fit_rows_per_sec=self.rate(train_rows, "load", "fit"),
+            score_rows_per_sec=self.rate(test_rows, "score"),
+        )
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def mark_cached(path):
+    # Flag metrics restored from the stage cache so `compare` skips them
+    with open(path) as f:
+        report = json.load(f)
+    report["cached"] = True
+    # Replace the file instead of rewriting it, it is hard-linked to the
+    # copy in the stage cache
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def compare(baseline, current, threshold):
+    # Print a markdown table for the CML report and return the throughput
+    # metrics that dropped by more than threshold
+    regressions = []
+    print("| metric | baseline | current | change |")
+    print("|---|---|---|---|")
+    for key in sorted(current):
+        if not key.endswith("_rows_per_sec"):
+            continue
+        old, new = baseline.get(key), current[key]
+        if not old or new is None:
+            print("| {} | - | {} | - |".format(key, new))
+            continue
+        change = (new - old) / old
+        print("| {} | {:.0f} | {:.0f} | {:+.1%} |".format(key, old, new, change))
+        if change < -threshold:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmp = sub.add_parser("compare", help="fail when throughput regressed against a baseline")
+    cmp.add_argument("baseline", help="metrics.json from the main branch")
+    cmp.add_argument("current", nargs="?", default="metrics.json")
+    cmp.add_argument("--threshold", type=float, default=0.1,
+                     help="allowed relative throughput drop (default: 0.1)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline.get("cached") or current.get("cached"):
+        # A stage cache hit restores the timings of an older run
+        print("Skipped the throughput check: metrics were restored from the stage cache, "
+              "rerun train.py with --no-cache")
+        sys.exit()
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print("\nThroughput regressed by more than {:.0%}: {}".format(
+            args.threshold, ", ".join(regressions)))
+        sys.exit(1)
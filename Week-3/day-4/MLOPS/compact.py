@@ -0,0 +1,69 @@
+import json
+import os
+import numpy as np
+
+# Flat, memory-mappable representation of a fitted RandomForestClassifier.
+# The nodes of all trees are concatenated into contiguous typed arrays with
+# global child indices. Leaves point to themselves with an infinite
+# threshold, so every row can take exactly `depth` steps from its root and
+# the traversal runs for all rows and trees at once without branching.
+MODEL_DIR = "model"
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes")
+
+
+def export_forest(clf, out_dir=MODEL_DIR):
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for est in clf.estimators_:
+        tree = est.tree_
+        leaf = tree.children_left == -1
+        ids = np.arange(tree.node_count)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(np.where(leaf, np.inf, tree.threshold))
+        left.append(np.where(leaf, ids, tree.children_left) + offset)
+        right.append(np.where(leaf, ids, tree.children_right) + offset)
+        counts = tree.value[:, 0, :]
+        value.append(counts / counts.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "value": np.concatenate(value).astype(np.float32),
+        "roots": np.array(roots, dtype=np.int64),
+        "classes": clf.classes_,
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, name + ".npy"), arr)
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"depth": int(depth), "n_features": int(clf.n_features_in_),
+                   "n_trees": len(roots), "n_nodes": int(offset)}, f, indent=2)
+
+
+def load_forest(model_dir=MODEL_DIR):
+    with open(os.path.join(model_dir, "meta.json")) as f:
+        model = json.load(f)
+    for name in ARRAYS:
+        model[name] = np.load(os.path.join(model_dir, name + ".npy"), mmap_mode="r")
+    return model
+
+
+def predict_proba(model, X):
+    # sklearn compares float32 features against float64 thresholds
+    X = np.asarray(X, dtype=np.float32)
+    rows = np.arange(len(X))[:, None]
+    node = np.repeat(np.asarray(model["roots"])[None, :], len(X), axis=0)
+    for _ in range(model["depth"]):
+        go_left = X[rows, model["feature"][node]] <= model["threshold"][node]
+        node = np.where(go_left, model["left"][node], model["right"][node])
+    return model["value"][node].mean(axis=1)
+
+
+def predict(model, X):
+    return np.asarray(model["classes"])[predict_proba(model, X).argmax(axis=1)]
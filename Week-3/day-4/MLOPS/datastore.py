@@ -0,0 +1,139 @@
+import itertools
+import json
+import os
+import numpy as np
+
+# Shared storage for the feature/label files written by get_data.py and
+# read by train.py. The binary .npy store is the default; CSV is kept as an
+# export for people who want to look at the numbers.
+DATA_DIR = "data"
+FORMATS = ("npy", "csv", "both")
+MANIFEST = "manifest.json"
+SHARD_DIR = "shard-{:05d}"
+ARRAYS = ("train_features", "test_features", "train_labels", "test_labels")
+
+
+def array_path(name, fmt, data_dir=DATA_DIR):
+    return os.path.join(data_dir, "{}.{}".format(name, fmt))
+
+
+def _extensions(fmt):
+    if fmt not in FORMATS:
+        raise ValueError("unknown format {!r}, expected one of {}".format(fmt, FORMATS))
+    return ("npy", "csv") if fmt == "both" else (fmt,)
+
+
+def _remove_stale_npy(name, fmt, data_dir):
+    # load_array prefers .npy, so a binary file left by an earlier run would
+    # shadow a newer CSV. CSVs are never removed: an unused one is harmless.
+    path = array_path(name, "npy", data_dir)
+    if "npy" not in _extensions(fmt) and os.path.exists(path):
+        os.remove(path)
+
+
+def save_array(name, arr, fmt="npy", data_dir=DATA_DIR):
+    _remove_stale_npy(name, fmt, data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    if fmt in ("npy", "both"):
+        np.save(array_path(name, "npy", data_dir), np.ascontiguousarray(arr))
+    if fmt in ("csv", "both"):
+        np.savetxt(array_path(name, "csv", data_dir), arr)
+
+
+def write_manifest(shards, data_dir=DATA_DIR, **info):
+    with open(os.path.join(data_dir, MANIFEST), "w") as f:
+        json.dump(dict(info, shards=shards), f, indent=2)
+
+
+def remove_manifest(data_dir=DATA_DIR):
+    path = os.path.join(data_dir, MANIFEST)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def shard_dirs(data_dir=DATA_DIR):
+    # A sharded dataset lists its shard directories in the manifest, a
+    # plain one is a single shard living in data_dir itself
+    path = os.path.join(data_dir, MANIFEST)
+    if not os.path.exists(path):
+        return [data_dir]
+    with open(path) as f:
+        manifest = json.load(f)
+    return [os.path.join(data_dir, shard["path"]) for shard in manifest["shards"]]
+
+
+def _load_one(name, data_dir):
+    # Memory-map the binary store so nothing is read until it is touched,
+    # fall back to parsing the CSV export
+    path = array_path(name, "npy", data_dir)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r")
+    return np.genfromtxt(array_path(name, "csv", data_dir))
+
+
+def load_array(name, data_dir=DATA_DIR):
+    arrays = [_load_one(name, d) for d in shard_dirs(data_dir)]
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+def iter_file_chunks(path, chunk_size):
+    # Row blocks of a single .npy or CSV file
+    if path.endswith(".npy"):
+        arr = np.load(path, mmap_mode="r")
+        for start in range(0, arr.shape[0], chunk_size):
+            yield np.array(arr[start:start + chunk_size])
+        return
+    with open(path) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            chunk = np.loadtxt(lines, ndmin=2)
+            # Match genfromtxt, which returns single-column files as 1-D
+            yield chunk[:, 0] if chunk.shape[1] == 1 else chunk
+
+
+def _iter_one(name, chunk_size, data_dir):
+    path = array_path(name, "npy", data_dir)
+    if not os.path.exists(path):
+        path = array_path(name, "csv", data_dir)
+    return iter_file_chunks(path, chunk_size)
+
+
+def iter_chunks(name, chunk_size, data_dir=DATA_DIR):
+    # Yield consecutive row blocks of at most chunk_size rows, shard by
+    # shard. Only the current block is ever held in memory.
+    for d in shard_dirs(data_dir):
+        yield from _iter_one(name, chunk_size, d)
+
+
+def count_rows(name, data_dir=DATA_DIR):
+    rows = 0
+    for d in shard_dirs(data_dir):
+        path = array_path(name, "npy", d)
+        if os.path.exists(path):
+            rows += np.load(path, mmap_mode="r").shape[0]
+        else:
+            with open(array_path(name, "csv", d)) as f:
+                rows += sum(1 for _ in f)
+    return rows
+
+
+def _dataset_dirs(n_shards, data_dir):
+    if not n_shards:
+        return [data_dir]
+    return [os.path.join(data_dir, SHARD_DIR.format(i)) for i in range(n_shards)]
+
+
+def dataset_files(fmt, n_shards=0, data_dir=DATA_DIR):
+    # Paths get_data.py writes for the given format and shard count
+    if not n_shards:
+        return [array_path(n, e, data_dir) for n in ARRAYS for e in _extensions(fmt)]
+    return [os.path.join(data_dir, MANIFEST)] + _dataset_dirs(n_shards, data_dir)
+
+
+def remove_stale_npy(fmt, n_shards=0, data_dir=DATA_DIR):
+    # Used before a stage cache restore, which only copies the files of fmt
+    for d in _dataset_dirs(n_shards, data_dir):
+        for name in ARRAYS:
+            _remove_stale_npy(name, fmt, d)
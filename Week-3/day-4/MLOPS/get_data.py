@@ -1,19 +1,70 @@
 from sklearn.datasets import make_classification
 from sklearn.model_selection import train_test_split
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import numpy as np
-import os
-
-seed = 42
-# Generate data
-X, y = make_classification(n_samples=1000, random_state=seed)
-
-# Make a train/test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=seed)
-
-# Save it
-if not os.path.isdir("data"):
-    os.mkdir("data")
-np.savetxt("data/train_features.csv", X_train)
-np.savetxt("data/test_features.csv", X_test)
-np.savetxt("data/train_labels.csv", y_train)
-np.savetxt("data/test_labels.csv", y_test)
+from datastore import (DATA_DIR, FORMATS, dataset_files, remove_manifest, remove_stale_npy,
+                       save_array, write_manifest)
+from shards import make_model, shard_sizes, write_shard
+from stagecache import detach, module_sources, restore, stage_key, store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=FORMATS, default="npy",
+                        help="npy is memory-mapped by train.py, csv is a text export")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--shards", type=int, default=0,
+                        help="generate the dataset as this many independent shards")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to generate shards (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="regenerate even on a stage cache hit")
+    args = parser.parse_args()
+
+    seed = 42
+
+    # The worker count does not change the data, so it is not part of the key
+    params = {"format": args.format, "samples": args.samples, "shards": args.shards, "seed": seed}
+    key = stage_key("get_data", [__file__] + module_sources("datastore", "shards", "stagecache"), params)
+    outputs = dataset_files(args.format, args.shards)
+    if not args.shards:
+        remove_manifest()
+    remove_stale_npy(args.format, args.shards)
+    if not args.no_cache and restore("get_data", key, outputs):
+        print("Restored data from the stage cache ({})".format(key[:12]))
+        return
+    detach(outputs)
+
+    if args.shards:
+        # Generate and write the shards in a process pool, each with its own
+        # seed spawned from the base seed
+        model = make_model(seed)
+        seeds = np.random.SeedSequence(seed).spawn(args.shards)
+        sizes = shard_sizes(args.samples, args.shards)
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [
+                pool.submit(write_shard, i, model, sizes[i], seeds[i], args.format, DATA_DIR)
+                for i in range(args.shards)
+            ]
+            shards = [f.result() for f in futures]
+        write_manifest(shards, seed=seed, samples=args.samples)
+    else:
+        # Generate data
+        X, y = make_classification(n_samples=args.samples, random_state=seed)
+
+        # Make a train/test split
+        X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=seed)
+
+        # Save it
+        save_array("train_features", X_train, args.format)
+        save_array("test_features", X_test, args.format)
+        save_array("train_labels", y_train, args.format)
+        save_array("test_labels", y_test, args.format)
+
+    store("get_data", key, outputs)
+
+
+if __name__ == "__main__":
+    # Shard workers may be started with spawn or forkserver, which import
+    # this module again; only the parent process runs the stage
+    main()
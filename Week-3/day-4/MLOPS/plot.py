@@ -0,0 +1,70 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+
+# Confusion matrix plot as a separate stage. train.py caches the test
+# predictions it computed while scoring, so plotting never predicts again,
+# and the plot is only re-rendered when the predictions or the model changed.
+# matplotlib is imported only when a plot is actually rendered.
+PREDICTIONS = "predictions.npz"
+PLOT = "plot.png"
+
+
+def save_predictions(y_true, y_pred, model_path, path=PREDICTIONS):
+    # Hash the pickle train.py already wrote instead of serializing the
+    # forest a second time
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    model_hash = h.hexdigest()
+    np.savez(path, y_true=y_true, y_pred=y_pred, model_hash=model_hash)
+
+
+def predictions_hash(predictions):
+    h = hashlib.sha256(str(predictions["model_hash"]).encode())
+    h.update(np.ascontiguousarray(predictions["y_true"]).tobytes())
+    h.update(np.ascontiguousarray(predictions["y_pred"]).tobytes())
+    return h.hexdigest()
+
+
+def render(y_true, y_pred, out):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    ConfusionMatrixDisplay.from_predictions(y_true, y_pred, normalize="true", cmap=plt.cm.Blues)
+    plt.savefig(out)
+    plt.close()
+
+
+def plot(predictions_path=PREDICTIONS, out=PLOT, force=False):
+    # Returns True when the plot was rendered, False when it was up to date
+    with np.load(predictions_path) as predictions:
+        digest = predictions_hash(predictions)
+        stamp = out + ".sha256"
+        if not force and os.path.exists(out) and os.path.exists(stamp):
+            with open(stamp) as f:
+                if f.read().strip() == digest:
+                    return False
+        # The plot may be a hard link into the stage cache; write a new file
+        # rather than through the link
+        for path in (out, stamp):
+            if os.path.exists(path):
+                os.remove(path)
+        render(predictions["y_true"], predictions["y_pred"], out)
+    with open(stamp, "w") as f:
+        f.write(digest + "\n")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--predictions", default=PREDICTIONS)
+    parser.add_argument("--out", default=PLOT)
+    parser.add_argument("--force", action="store_true", help="render even if up to date")
+    args = parser.parse_args()
+    if not plot(args.predictions, args.out, args.force):
+        print("{} is up to date".format(args.out))
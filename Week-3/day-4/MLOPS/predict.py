@@ -0,0 +1,26 @@
+import argparse
+import time
+import numpy as np
+from compact import MODEL_DIR, load_forest, predict
+from datastore import iter_file_chunks
+
+# Score a feature file with the flat model exported by train.py. The model
+# arrays are memory-mapped, so start-up does not depend on the forest size.
+parser = argparse.ArgumentParser()
+parser.add_argument("features", help=".npy or CSV feature file")
+parser.add_argument("--model", default=MODEL_DIR)
+parser.add_argument("--batch-size", type=int, default=10000,
+                    help="rows scored at once; memory grows with rows x trees")
+parser.add_argument("--out", default="predictions.npy")
+args = parser.parse_args()
+
+start = time.perf_counter()
+model = load_forest(args.model)
+loaded = time.perf_counter()
+y_pred = [predict(model, X) for X in iter_file_chunks(args.features, args.batch_size)]
+y_pred = np.concatenate(y_pred)
+done = time.perf_counter()
+np.save(args.out, y_pred)
+
+print("Loaded model in {:.1f} ms".format((loaded - start) * 1000))
+print("Scored {} rows in {:.3f} s".format(len(y_pred), done - loaded))
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from datastore import SHARD_DIR, save_array
+
+# Sharded version of make_classification. The class structure (cluster
+# centroids, per-cluster covariance, redundant feature mixing and feature
+# order) is drawn once from the base seed and shared by every shard; each
+# shard only draws its own samples, from a seed spawned off the base seed.
+# Shards are therefore independent samples of one distribution and the
+# output only depends on the seed and the shard sizes.
+
+
+def make_model(seed, n_features=20, n_informative=2, n_redundant=2,
+               n_classes=2, n_clusters_per_class=2, class_sep=1.0):
+    rng = np.random.default_rng(seed)
+    n_clusters = n_classes * n_clusters_per_class
+    vertices = rng.choice(2 ** n_informative, n_clusters, replace=False)
+    bits = (vertices[:, None] >> np.arange(n_informative)) & 1
+    return {
+        "n_features": n_features,
+        "n_informative": n_informative,
+        "n_redundant": n_redundant,
+        "n_classes": n_classes,
+        "centroids": bits * 2 * class_sep - class_sep,
+        "covariances": 2 * rng.random((n_clusters, n_informative, n_informative)) - 1,
+        "redundant": 2 * rng.random((n_informative, n_redundant)) - 1,
+        "permutation": rng.permutation(n_features),
+    }
+
+
+def make_shard(model, n_samples, seed, flip_y=0.01):
+    rng = np.random.default_rng(seed)
+    n_inf = model["n_informative"]
+    n_red = model["n_redundant"]
+    n_clusters = len(model["centroids"])
+
+    cluster = rng.integers(n_clusters, size=n_samples)
+    X = np.empty((n_samples, model["n_features"]))
+    informative = rng.standard_normal((n_samples, n_inf))
+    informative = np.einsum("ni,nij->nj", informative, model["covariances"][cluster])
+    informative += model["centroids"][cluster]
+    X[:, :n_inf] = informative
+    X[:, n_inf:n_inf + n_red] = informative @ model["redundant"]
+    X[:, n_inf + n_red:] = rng.standard_normal((n_samples, model["n_features"] - n_inf - n_red))
+
+    y = cluster % model["n_classes"]
+    flip = rng.random(n_samples) < flip_y
+    y[flip] = rng.integers(model["n_classes"], size=flip.sum())
+    return X[:, model["permutation"]], y
+
+
+def write_shard(index, model, n_samples, seed, fmt, data_dir, test_size=0.25):
+    # Rows are i.i.d., so the split needs no shuffling
+    X, y = make_shard(model, n_samples, seed)
+    n_test = int(np.ceil(test_size * n_samples))
+    path = SHARD_DIR.format(index)
+    shard_dir = os.path.join(data_dir, path)
+    save_array("train_features", X[n_test:], fmt, shard_dir)
+    save_array("test_features", X[:n_test], fmt, shard_dir)
+    save_array("train_labels", y[n_test:], fmt, shard_dir)
+    save_array("test_labels", y[:n_test], fmt, shard_dir)
+    return {"path": path, "train_rows": n_samples - n_test, "test_rows": n_test}
+
+
+def shard_sizes(n_samples, n_shards):
+    sizes = np.full(n_shards, n_samples // n_shards)
+    sizes[:n_samples % n_shards] += 1
+    return sizes.tolist()
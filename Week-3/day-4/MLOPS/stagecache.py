@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+# Local cache for the get_data.py and train.py stages, in the spirit of a DVC
+# run cache. A stage's key hashes the stage name, the source of the scripts it
+# runs, its parameters and the content of its input files; its outputs are
+# hard-linked into CACHE_DIR/<stage>/<key>/ and linked back on a hit, so the
+# cache costs no extra disk space or I/O for outputs that are still in place.
+# Files are copied where hard links are not supported. Only the
+# CACHE_ENTRIES most recently used entries of a stage are kept.
+CACHE_DIR = ".stage_cache"
+CACHE_ENTRIES = 8
+
+
+def _update_file(h, path):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def _walk(paths):
+    # Expand directories into the sorted list of files below them
+    for path in sorted(paths):
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        elif os.path.exists(path):
+            yield path
+
+
+def module_sources(*modules):
+    # Source files of already imported modules, for hashing into a key
+    return [sys.modules[name].__file__ for name in modules]
+
+
+def stage_key(stage, sources, params, inputs=()):
+    h = hashlib.sha256(stage.encode())
+    for path in sources:
+        _update_file(h, path)
+    h.update(json.dumps(params, sort_keys=True).encode())
+    for path in _walk(inputs):
+        h.update(path.encode())
+        _update_file(h, path)
+    return h.hexdigest()
+
+
+def _entry(stage, key):
+    return os.path.join(CACHE_DIR, stage, key)
+
+
+def _link_file(src, dst):
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link(src, dst):
+    if not os.path.isdir(src):
+        _link_file(src, dst)
+        return
+    for path in _walk([src]):
+        _link_file(path, os.path.join(dst, os.path.relpath(path, src)))
+
+
+def detach(outputs):
+    # A stage that runs must not write through a hard link into a cache
+    # entry, so remove every output file that is still linked to one
+    for path in _walk(outputs):
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+
+
+def restore(stage, key, outputs):
+    # Link the cached outputs back into place; False on a cache miss
+    entry = _entry(stage, key)
+    if not all(os.path.exists(os.path.join(entry, path)) for path in outputs):
+        return False
+    for path in outputs:
+        _link(os.path.join(entry, path), path)
+    os.utime(entry)
+    return True
+
+
+def prune(stage, keep=CACHE_ENTRIES):
+    # Drop the least recently stored or restored entries of a stage
+    root = os.path.join(CACHE_DIR, stage)
+    entries = [os.path.join(root, name) for name in os.listdir(root)
+               if not name.endswith(".tmp")]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry in entries[keep:]:
+        shutil.rmtree(entry, ignore_errors=True)
+
+
+def store(stage, key, outputs):
+    # Write into a temporary directory first so an interrupted run never
+    # leaves a partial entry behind
+    entry = _entry(stage, key)
+    tmp = entry + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    for path in outputs:
+        _link(path, os.path.join(tmp, path))
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+    os.utime(entry)
+    prune(stage)
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def merge_forests(forests):
+    # Concatenate the trees of forests fitted on different chunks. The
+    # forest predicts by averaging tree probabilities, so the merged model
+    # is the ensemble of every chunk's trees.
+    merged = forests[0]
+    for forest in forests[1:]:
+        if not np.array_equal(forest.classes_, merged.classes_):
+            raise ValueError("forests were fitted on different classes")
+        merged.estimators_ += forest.estimators_
+    merged.n_estimators = len(merged.estimators_)
+    return merged
+
+
+def chunk_classes(y_chunks):
+    # Every label in the training set, read one label block at a time
+    classes = np.array([])
+    for y in y_chunks:
+        classes = np.union1d(classes, np.unique(y))
+    return classes
+
+
+def fit_chunked(make_estimator, X_chunks, y_chunks, classes):
+    # A chunk missing one of the classes (typically the short tail of a file
+    # or shard) is carried over and fitted together with the next chunk. A
+    # tail left over at the end is folded into the last fitted block, which
+    # is refitted, so peak memory is about two chunks.
+    forests = []
+    pending_X, pending_y = [], []
+    last = None
+    for X, y in zip(X_chunks, y_chunks):
+        pending_X.append(X)
+        pending_y.append(y)
+        y_all = np.concatenate(pending_y)
+        if np.isin(classes, y_all).all():
+            X_all = np.concatenate(pending_X)
+            forests.append(make_estimator().fit(X_all, y_all))
+            last = (X_all, y_all)
+            pending_X, pending_y = [], []
+    if not forests:
+        raise ValueError("no training data")
+    if pending_y:
+        X_all = np.concatenate([last[0]] + pending_X)
+        y_all = np.concatenate([last[1]] + pending_y)
+        forests[-1] = make_estimator().fit(X_all, y_all)
+    return merge_forests(forests)
+
+
+def predict_chunked(clf, X_chunks, y_chunks):
+    # Predict block by block; only the label vectors are kept
+    y_true, y_pred = [], []
+    for X, y in zip(X_chunks, y_chunks):
+        y_true.append(y)
+        y_pred.append(clf.predict(X))
+    return np.concatenate(y_true), np.concatenate(y_pred)
@@ -0,0 +1,188 @@
+from sklearn.ensemble import RandomForestClassifier
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import itertools
+import os
+import tempfile
+import time
+import numpy as np
+from datastore import load_array
+
+# Hyperparameter sweep over the train.py forest. Candidates are evaluated in
+# a process pool. The training arrays are written once as float32 .npy files
+# (the dtype the trees work in, so sklearn does not convert them) and every
+# worker memory-maps them read-only, so they are shared through the page
+# cache instead of being copied into each worker.
+seed = 42
+_data = {}
+
+
+def parse_values(text, cast):
+    values = []
+    for item in text.split(","):
+        if item == "None":
+            values.append(None)
+        else:
+            try:
+                values.append(cast(item))
+            except ValueError:
+                values.append(item)
+    return values
+
+
+def max_features(item):
+    # "sqrt"/"log2" stay strings, "0.5" is a fraction, "3" a count
+    return float(item) if "." in item else int(item)
+
+
+def grid(space):
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_candidates(space, n, rng):
+    configs = grid(space)
+    picks = rng.choice(len(configs), size=min(n, len(configs)), replace=False)
+    return [configs[i] for i in picks]
+
+
+def share_arrays(tmpdir):
+    # Return paths of float32 copies of the features and of the labels
+    paths = {}
+    for name in ("train_features", "test_features", "train_labels", "test_labels"):
+        arr = load_array(name)
+        if name.endswith("features"):
+            arr = np.asarray(arr, dtype=np.float32)
+        paths[name] = os.path.join(tmpdir, name + ".npy")
+        np.save(paths[name], np.ascontiguousarray(arr))
+    return paths
+
+
+def _open_shared(paths):
+    for name, path in paths.items():
+        _data[name] = np.load(path, mmap_mode="r")
+
+
+def evaluate(config):
+    clf = RandomForestClassifier(random_state=seed, n_jobs=1, **config)
+    start = time.perf_counter()
+    clf.fit(_data["train_features"], _data["train_labels"])
+    fit_seconds = time.perf_counter() - start
+    acc = clf.score(_data["test_features"], _data["test_labels"])
+    return dict(config, fit_seconds=fit_seconds, accuracy=acc)
+
+
+def run(candidates, workers):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = share_arrays(tmpdir)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_shared,
+                                 initargs=(paths,)) as pool:
+            return list(pool.map(evaluate, candidates))
+
+
+def successive_halving(candidates, data, min_trees, max_trees, eta, tol, metric):
+    # Grow every candidate's forest with warm_start, starting from min_trees
+    # and multiplying the size by eta each rung. After each rung only the
+    # best 1/eta candidates keep growing; a candidate also stops once its
+    # score improved by less than tol since the previous rung.
+    alive = []
+    for config in candidates:
+        clf = RandomForestClassifier(warm_start=True, oob_score=metric == "oob",
+                                     random_state=seed, n_jobs=-1, **config)
+        alive.append({"config": config, "clf": clf, "fit_seconds": 0.0, "score": None})
+
+    finished = []
+    n_trees = min_trees
+    while alive:
+        for cand in alive:
+            clf = cand["clf"]
+            clf.set_params(n_estimators=n_trees)
+            start = time.perf_counter()
+            clf.fit(data["train_features"], data["train_labels"])
+            cand["fit_seconds"] += time.perf_counter() - start
+            if metric == "oob":
+                score = clf.oob_score_
+            else:
+                score = clf.score(data["test_features"], data["test_labels"])
+            cand["plateau"] = cand["score"] is not None and score - cand["score"] < tol
+            cand["score"] = score
+
+        alive.sort(key=lambda c: -c["score"])
+        keep = max(1, len(alive) // eta)
+        for cand in alive[keep:]:
+            cand["status"] = "pruned"
+        for cand in alive[:keep]:
+            if cand["plateau"]:
+                cand["status"] = "plateau"
+            elif n_trees >= max_trees:
+                cand["status"] = "max_trees"
+        finished += [c for c in alive if "status" in c]
+        alive = [c for c in alive if "status" not in c]
+        n_trees = min(n_trees * eta, max_trees)
+
+    results = []
+    for cand in finished:
+        clf = cand["clf"]
+        acc = clf.score(data["test_features"], data["test_labels"])
+        results.append(dict(cand["config"], n_estimators=clf.n_estimators, status=cand["status"],
+                            score=cand["score"], fit_seconds=cand["fit_seconds"], accuracy=acc))
+    return results
+
+
+def write_leaderboard(results, path, key="accuracy"):
+    results = sorted(results, key=lambda r: (-r[key], r["fit_seconds"]))
+    fields = list(results[0])
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["rank"] + fields)
+        writer.writeheader()
+        for rank, row in enumerate(results, 1):
+            writer.writerow(dict(row, rank=rank))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-depth", default="2,4,8,None")
+    parser.add_argument("--n-estimators", default="50,100,200")
+    parser.add_argument("--max-features", default="sqrt,log2,0.5")
+    parser.add_argument("--random", type=int, default=0,
+                        help="evaluate this many random candidates instead of the full grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--halving", action="store_true",
+                        help="pick n_estimators by successive halving instead of the grid")
+    parser.add_argument("--min-trees", type=int, default=10)
+    parser.add_argument("--max-trees", type=int, default=640)
+    parser.add_argument("--eta", type=int, default=2)
+    parser.add_argument("--tol", type=float, default=0.001)
+    parser.add_argument("--metric", choices=("oob", "holdout"), default="oob")
+    parser.add_argument("--out", default="leaderboard.csv")
+    args = parser.parse_args()
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+    if args.min_trees < 1 or args.min_trees > args.max_trees:
+        parser.error("--min-trees must be between 1 and --max-trees")
+
+    space = {
+        "max_depth": parse_values(args.max_depth, int),
+        "n_estimators": parse_values(args.n_estimators, int),
+        "max_features": parse_values(args.max_features, max_features),
+    }
+    if args.halving:
+        # The forest size is what halving searches for
+        del space["n_estimators"]
+    if args.random:
+        candidates = random_candidates(space, args.random, np.random.default_rng(seed))
+    else:
+        candidates = grid(space)
+
+    if args.halving:
+        data = {name: load_array(name) for name in
+                ("train_features", "test_features", "train_labels", "test_labels")}
+        results = successive_halving(candidates, data, args.min_trees, args.max_trees,
+                                     args.eta, args.tol, args.metric)
+        results = write_leaderboard(results, args.out, key="score")
+    else:
+        results = write_leaderboard(run(candidates, args.workers), args.out)
+    for rank, row in enumerate(results[:5], 1):
+        print(rank, row)
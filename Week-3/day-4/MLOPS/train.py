@@ -1,26 +1,98 @@
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import plot_confusion_matrix
-import matplotlib.pyplot as plt
+import argparse
 import json
 import os
+import pickle
+import sys
 import numpy as np
+from bench import Benchmark, mark_cached
+from compact import MODEL_DIR, export_forest
+from datastore import DATA_DIR, count_rows, iter_chunks, load_array
+from plot import PLOT, PREDICTIONS, plot, save_predictions
+from stagecache import detach, module_sources, restore, stage_key, store
+from streaming import chunk_classes, fit_chunked, predict_chunked
 
-# Read in data
-X_train = np.genfromtxt("data/train_features.csv")
-y_train = np.genfromtxt("data/train_labels.csv")
-X_test = np.genfromtxt("data/test_features.csv")
-y_test = np.genfromtxt("data/test_labels.csv")
+parser = argparse.ArgumentParser()
+parser.add_argument("--chunk-size", type=int, default=0,
+                    help="train out of core on blocks of this many rows")
+parser.add_argument("--trees-per-chunk", type=int, default=10)
+parser.add_argument("--no-plot", action="store_true",
+                    help="skip the plot stage; run `python plot.py` later")
+parser.add_argument("--no-cache", action="store_true", help="retrain even on a stage cache hit")
+args = parser.parse_args()
 
-# Fit a model
 depth = 4
-clf = RandomForestClassifier(max_depth=depth)
-clf.fit(X_train, y_train)
+bench = Benchmark()
 
-acc = clf.score(X_test, y_test)
+# Restore the model, metrics and plot when neither the code, the parameters
+# nor the data changed since a cached run
+params = {"depth": depth, "chunk_size": args.chunk_size,
+          "trees_per_chunk": args.trees_per_chunk, "plot": not args.no_plot}
+sources = [__file__] + module_sources("bench", "compact", "datastore", "plot",
+                                        "stagecache", "streaming")
+key = stage_key("train", sources, params, [DATA_DIR])
+outputs = ["model.pkl", MODEL_DIR, "metrics.txt", "metrics.json", PREDICTIONS]
+if not args.no_plot:
+    outputs += [PLOT, PLOT + ".sha256"]
+if not args.no_cache and restore("train", key, outputs):
+    print("Restored model and metrics from the stage cache ({})".format(key[:12]))
+    mark_cached("metrics.json")
+    with open("metrics.txt") as f:
+        print(f.read(), end="")
+    sys.exit()
+detach(outputs)
+
+if args.chunk_size:
+    # Fit a small forest per chunk and merge them, so memory is bounded by
+    # the chunk size rather than the dataset size. Loading is interleaved
+    # with fitting and scoring, so it is timed as part of those stages.
+    with bench.stage("fit"):
+        clf = fit_chunked(
+            lambda: RandomForestClassifier(max_depth=depth, n_estimators=args.trees_per_chunk),
+            iter_chunks("train_features", args.chunk_size),
+            iter_chunks("train_labels", args.chunk_size),
+            chunk_classes(iter_chunks("train_labels", args.chunk_size)),
+        )
+    with bench.stage("score"):
+        y_test, y_pred = predict_chunked(
+            clf,
+            iter_chunks("test_features", args.chunk_size),
+            iter_chunks("test_labels", args.chunk_size),
+        )
+    train_rows = count_rows("train_labels")
+else:
+    # Read in data
+    with bench.stage("load"):
+        X_train = load_array("train_features")
+        y_train = load_array("train_labels")
+        X_test = load_array("test_features")
+        y_test = load_array("test_labels")
+
+    # Fit a model
+    with bench.stage("fit"):
+        clf = RandomForestClassifier(max_depth=depth)
+        clf.fit(X_train, y_train)
+
+    with bench.stage("score"):
+        y_pred = clf.predict(X_test)
+    train_rows = len(y_train)
+
+acc = float(np.mean(y_test == y_pred))
 print(acc)
 with open("metrics.txt", "w") as outfile:
     outfile.write("Accuracy: " + str(acc) + "\n")
 
+with open("model.pkl", "wb") as f:
+    pickle.dump(clf, f)
+export_forest(clf)
+
+# Cache the predictions for the plot stage
+save_predictions(y_test, y_pred, "model.pkl")
+
 # Plot it
-disp = plot_confusion_matrix(clf, X_test, y_test, normalize="true", cmap=plt.cm.Blues)
-plt.savefig("plot.png")
+if not args.no_plot:
+    with bench.stage("plot"):
+        plot()
+
+bench.write("metrics.json", train_rows, len(y_test), accuracy=acc)
+store("train", key, outputs)